@@ -0,0 +1,241 @@
+import os
+import gzip
+import glob
+import json
+import sqlite3
+import inspect
+import hashlib
+import argparse
+
+from functionSandbox import SandboxPool, SandboxJob, SandboxResult
+
+# Checks that mutants behave like the module they were made from. A module is run in a sandbox worker, then every call
+# of its input set is made on it, and what it printed, returned and raised is hashed. The observations of an original are
+# cached by the hash of its source and of the input set, so every original is only run once however many mutants it has.
+
+SUMMARY_LENGTH = 200                                        # characters of each observation kept for the report, the digest covers all of it
+
+def observe(source, calls, module_name):
+    # Runs in a sandbox worker: executes the module and makes the calls of the input set, each call being
+    # (function name, args, kwargs). Returns the digest of everything observed and a shortened copy for reports.
+    import io, re, json, random, hashlib, contextlib
+
+    def canonical(value, seen=frozenset()):
+        # repr with the elements of sets and the items of dicts sorted, their order depends on PYTHONHASHSEED and a
+        # baseline cached by another process would not match otherwise
+        kind = type(value)
+        if kind not in (set, frozenset, dict, list, tuple):
+            return repr(value)
+        if id(value) in seen:
+            return "{...}" if kind is dict else "[...]"
+        seen = seen | {id(value)}
+        if kind is dict:
+            return "{" + ", ".join(sorted(f"{canonical(key, seen)}: {canonical(item, seen)}" for key, item in value.items())) + "}"
+        items = [canonical(item, seen) for item in value]
+        if kind is list:
+            return "[" + ", ".join(items) + "]"
+        if kind is tuple:
+            return "(" + ", ".join(items) + ("," if len(items) == 1 else "") + ")"
+        items = ", ".join(sorted(items))
+        if kind is set:
+            return "{" + items + "}" if items else "set()"
+        return "frozenset({" + items + "})" if items else "frozenset()"
+
+    def without_addresses(text):                            # the memory addresses of default reprs change from one run to the next
+        return re.sub(r"0x[0-9a-fA-F]{6,}", "0x", text)
+
+    def run(function, *args, **kwargs):
+        stdout = io.StringIO()
+        value = exception = None
+        try:
+            with contextlib.redirect_stdout(stdout):
+                value = without_addresses(canonical(function(*args, **kwargs)))
+        except MemoryError:
+            raise
+        except (Exception, SystemExit) as e:
+            exception = without_addresses(f"{type(e).__name__}: {e}")
+        return {"stdout": without_addresses(stdout.getvalue()), "value": value, "exception": exception}
+
+    random.seed(0)                                          # a forked worker reseeds random from the system, the original and the mutant have to draw the same numbers
+    namespace = {"__name__": module_name}
+    observations = [dict(call=None, **run(lambda: exec(compile(source, f"<{module_name}>", "exec"), namespace)))]
+    for name, args, kwargs in calls:
+        function = namespace.get(name)
+        if function is None:
+            observations.append({"call": name, "stdout": "", "value": None, "exception": f"NameError: name '{name}' is not defined"})
+        else:
+            observations.append(dict(call=name, **run(function, *args, **(kwargs or {}))))
+
+    digest = hashlib.sha256(json.dumps(observations, sort_keys=True).encode()).hexdigest()
+    summary = [{key: value[:SUMMARY_LENGTH] if isinstance(value, str) else value for key, value in observation.items()} for observation in observations]
+    return digest, summary
+
+OBSERVER_SOURCE = f"SUMMARY_LENGTH = {SUMMARY_LENGTH}\n" + inspect.getsource(observe)    # sent to the workers, which compile it once
+OBSERVER_HASH = hashlib.sha256(OBSERVER_SOURCE.encode()).hexdigest()    # part of the cache key, baselines observed by another version of observe are not reused
+
+def source_hash(source):
+    return hashlib.sha256(source.encode()).hexdigest()
+
+def inputs_hash(calls, module_name):
+    return hashlib.sha256(json.dumps([module_name, calls, OBSERVER_HASH], sort_keys=True).encode()).hexdigest()
+
+
+class BaselineCache:
+    # Observations of the originals, keyed by the hash of their source and of the input set they were run with.
+    # In memory unless a path is given, in which case they are kept across runs.
+    def __init__(self, path=":memory:"):
+        self.connection = sqlite3.connect(path)
+        self.connection.execute("""
+        CREATE TABLE IF NOT EXISTS baselines (
+            source_hash TEXT NOT NULL,
+            inputs_hash TEXT NOT NULL,
+            ok BOOLEAN NOT NULL,
+            digest TEXT,
+            summary TEXT,
+            error TEXT,
+            message TEXT,
+            PRIMARY KEY (source_hash, inputs_hash)
+        )
+        """)
+
+    def get(self, source_key, inputs_key):                  # the SandboxResult of the original, None if it was never run
+        row = self.connection.execute("SELECT ok, digest, summary, error, message FROM baselines WHERE source_hash = ? AND inputs_hash = ?",
+                                      (source_key, inputs_key)).fetchone()
+        if row is None:
+            return None
+        ok, digest, summary, error, message = row
+        return SandboxResult(bool(ok), (digest, json.loads(summary)) if ok else None, error, message)
+
+    def put(self, source_key, inputs_key, result):
+        digest, summary = result.value if result.ok else (None, None)
+        self.connection.execute("INSERT OR REPLACE INTO baselines (source_hash, inputs_hash, ok, digest, summary, error, message) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                                (source_key, inputs_key, result.ok, digest, json.dumps(summary), result.error, result.message))
+
+    def commit(self):
+        self.connection.commit()
+
+    def close(self):
+        self.connection.commit()
+        self.connection.close()
+
+
+# Reasons a mutant is reported, besides the sandbox failures (timeout, memory, crash...) of a mutant whose original ran fine
+DIFFERENT_OUTPUT = "different output"
+BASELINE_FAILED = "baseline failed"                         # the original itself timed out or crashed, the mutant cannot be compared to it
+
+class EquivalenceChecker:
+    # sandbox should be made with isolate_jobs, otherwise what a module imports or changes in its worker is still there
+    # when the next module runs there, and an original and its mutant can be observed in different states
+    def __init__(self, sandbox, cache=None, module_name="__mutant__"):
+        self.sandbox = sandbox
+        self.cache = cache if cache is not None else BaselineCache()
+        self.module_name = module_name                      # __name__ the modules run under, "__main__" runs their main block too
+        self.baseline_runs = 0
+        self.baseline_hits = 0
+
+    def job(self, source, calls):
+        return SandboxJob("observe", OBSERVER_SOURCE, "observe", (source, calls, self.module_name), None)
+
+    def baselines(self, originals):
+        # originals is a list of (source, calls). Returns their SandboxResults, running together the ones not in the cache
+        results = [None] * len(originals)
+        missing = {}                                        # (source hash, inputs hash) -> positions, so that an original is only run once per batch
+        for position, (source, calls) in enumerate(originals):
+            key = (source_hash(source), inputs_hash(calls, self.module_name))
+            results[position] = self.cache.get(*key)
+            if results[position] is None:
+                missing.setdefault(key, []).append(position)
+            else:
+                self.baseline_hits += 1
+
+        runs = list(missing.items())
+        outcomes = self.sandbox.map([self.job(*originals[positions[0]]) for _, positions in runs])
+        for (key, positions), result in zip(runs, outcomes):
+            self.cache.put(*key, result)
+            for position in positions:
+                results[position] = result
+        self.baseline_runs += len(runs)
+        self.cache.commit()
+        return results
+
+    def check_many(self, pairs):
+        # pairs is a list of (original source, mutant source, calls). Returns for each one None when the mutant behaves like
+        # the original, else (reason, what the original did, what the mutant did)
+        expected = self.baselines([(original, calls) for original, _, calls in pairs])
+        actual = self.sandbox.map([self.job(mutant, calls) for _, mutant, calls in pairs])
+        verdicts = []
+        for baseline, result in zip(expected, actual):
+            if not baseline.ok:
+                verdicts.append((BASELINE_FAILED, f"{baseline.error}: {baseline.message}", None))
+            elif not result.ok:
+                verdicts.append((result.error, baseline.value[1], result.message))
+            elif result.value[0] != baseline.value[0]:
+                verdicts.append((DIFFERENT_OUTPUT, baseline.value[1], result.value[1]))
+            else:
+                verdicts.append(None)
+        return verdicts
+
+    def check(self, original, mutant, calls=()):
+        return self.check_many([(original, mutant, [list(call) for call in calls])])[0]
+
+
+def iter_mutant_records(folder):                            # records of the shards written by pythonMutator.py, in shard order
+    for path in sorted(glob.glob(os.path.join(folder, "*.jsonl")) + glob.glob(os.path.join(folder, "*.jsonl.gz"))):
+        with (gzip.open(path, 'rt', encoding="utf8") if path.endswith(".gz") else open(path, 'r', encoding="utf8")) as f:
+            for line in f:
+                yield json.loads(line)
+
+def batches(records, size):
+    batch = []
+    for record in records:
+        batch.append(record)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check that mutants behave like the files they were made from")
+    parser.add_argument("-p", "--path", help="Path to the folder the mutants were generated from", required=True)
+    parser.add_argument("-m", "--mutants", default="mutants", help="Folder of the shards written by pythonMutator.py")
+    parser.add_argument("-o", "--output", default="non_equivalent.jsonl", help="File the mutants that do not behave like their original are written to")
+    parser.add_argument("-i", "--inputs", help='JSON file mapping file names, or "*" for every file, to the calls made after running them, like {"*": [["main", [1, 2], {}]]}')
+    parser.add_argument("-j", "--jobs", type=int, default=0, help="Number of sandbox workers (0 uses every core)")
+    parser.add_argument("-t", "--timeout", type=float, default=1.0, help="Seconds of CPU time a module and its calls may use")
+    parser.add_argument("-c", "--cache", default=":memory:", help="Path to an SQLite cache of the observations of the originals, kept across runs")
+    parser.add_argument("-b", "--batch-size", type=int, default=512, help="Number of mutants sent to the workers at once")
+    parser.add_argument("--main", action="store_true", help='Run the modules as "__main__", including their main block')
+    args = parser.parse_args()
+
+    inputs = {}
+    if args.inputs:
+        with open(args.inputs, 'r', encoding="utf8") as f:
+            inputs = json.load(f)
+
+    originals = {}                                          # file name -> source, the files are small next to their mutants
+    def original_source(name):
+        if name not in originals:
+            with open(os.path.join(args.path, name), 'r', encoding="utf8") as f:
+                originals[name] = f.read()
+        return originals[name]
+
+    checked = reported = 0
+    reasons = {}
+    cache = BaselineCache(args.cache)
+    with SandboxPool(args.jobs or None, timeout=args.timeout, isolate_jobs=True) as sandbox, open(args.output, 'w', encoding="utf8") as report:
+        checker = EquivalenceChecker(sandbox, cache, "__main__" if args.main else "__mutant__")
+        for batch in batches(iter_mutant_records(args.mutants), args.batch_size):
+            pairs = [(original_source(record["file"]), record["source"], inputs.get(record["file"], inputs.get("*", []))) for record in batch]
+            for record, verdict in zip(batch, checker.check_many(pairs)):
+                checked += 1
+                if verdict is None:
+                    continue
+                reason, expected, actual = verdict
+                reasons[reason] = reasons.get(reason, 0) + 1
+                reported += 1
+                report.write(json.dumps({"file": record["file"], "mutant": record["mutant"], "hash": record["hash"], "reason": reason,
+                                         "expected": expected, "actual": actual, "mutations": record["mutations"]}) + "\n")
+    cache.close()
+    print(f"Mutants: {checked} checked, {checked - reported} equivalent, {reported} reported ({', '.join(f'{n} {reason}' for reason, n in sorted(reasons.items())) or 'none'})")
+    print(f"Originals: {checker.baseline_runs} run, {checker.baseline_hits} from the cache")
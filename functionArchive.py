@@ -0,0 +1,248 @@
+import os
+import ast
+import sys
+import json
+import mmap
+import array
+import shutil
+import struct
+import tempfile
+import collections.abc
+
+# Read-only file of the functions of a FunctionDB, opened with mmap so that a database of millions of functions is
+# ready as soon as its header is read. The sources of the functions are one contiguous blob cut by an offsets array,
+# the other fields are fixed-width columns indexed by function, and names, return types and parameter signatures are
+# ids into a table of interned strings. Nothing is decoded or parsed before a function is asked for.
+#
+# Layout, every section starting on 8 bytes:
+#   header          MAGIC, byte order, function count, string count, then the (offset, length) of each section
+#   source_offsets  count + 1 uint64, function i is source_blob[source_offsets[i]:source_offsets[i + 1]]
+#   source_blob     utf8 sources as written by ast.unparse
+#   origin_offsets  count + 1 uint64
+#   origin_blob     JSON list of the [file name, function name] of every copy of each function
+#   string_offsets  strings + 1 uint64
+#   string_blob     utf8 interned strings
+#   name, return_type, signature    uint32 string ids, the signature is the JSON of the parameters
+#   flags, copies   uint32
+#   fingerprint     32 bytes per function, the sha256 of function_fingerprint
+
+MAGIC = b"PMFUNCS1"
+SECTIONS = ('source_offsets', 'source_blob', 'origin_offsets', 'origin_blob', 'string_offsets', 'string_blob',
+            'name', 'return_type', 'signature', 'flags', 'copies', 'fingerprint')
+HEADER = struct.Struct(f"<8scxxxII{2 * len(SECTIONS)}Q")
+BYTE_ORDER = b'l' if sys.byteorder == 'little' else b'b'     # columns are written in native order and mapped as they are
+
+HAS_FUNCTION_CALL = 1                                       # bits of the flags column
+FINGERPRINT_SIZE = 32
+
+
+class FunctionArchiveError(Exception):
+    pass
+
+
+def align(f):                                               # pads the file to the next multiple of 8 bytes and returns the position
+    position = f.tell()
+    if position % 8:
+        f.write(b"\0" * (8 - position % 8))
+    return f.tell()
+
+def write_function_archive(path, functions):
+    # functions is an iterable of dicts with the keys of FunctionDB entries: "code" (the unparsed source), "name", "params",
+    # "return_type", "has_function_call", "fingerprint", "copies" and "origins". The sources are streamed to the file,
+    # only the fixed-width columns and the interned strings are held in memory. The archive replaces `path` once complete.
+    strings = {}
+    def intern(string):
+        if string not in strings:
+            strings[string] = len(strings)
+        return strings[string]
+
+    columns = {name: array.array('I') for name in ('name', 'return_type', 'signature', 'flags', 'copies')}
+    source_offsets, origin_offsets = array.array('Q', [0]), array.array('Q', [0])
+    fingerprints = bytearray()
+    sections = {}
+
+    temporary = f"{path}.tmp"
+    with open(temporary, 'wb') as f, tempfile.TemporaryFile() as origins:
+        f.write(b"\0" * HEADER.size)
+        start = align(f)
+        for entry in functions:
+            source = entry["code"].encode()
+            f.write(source)
+            source_offsets.append(source_offsets[-1] + len(source))
+            origin = json.dumps(entry.get("origins", [])).encode()
+            origins.write(origin)
+            origin_offsets.append(origin_offsets[-1] + len(origin))
+            columns['name'].append(intern(entry["name"]))
+            columns['return_type'].append(intern(entry.get("return_type", "Unknown")))
+            columns['signature'].append(intern(json.dumps(entry["params"])))
+            columns['flags'].append(HAS_FUNCTION_CALL if entry.get("has_function_call") else 0)
+            columns['copies'].append(entry.get("copies", 1))
+            fingerprint = bytes.fromhex(entry["fingerprint"]) if entry.get("fingerprint") else b""
+            fingerprints += fingerprint.ljust(FINGERPRINT_SIZE, b"\0")
+        sections['source_blob'] = (start, f.tell() - start)
+
+        def write_section(name, data):
+            start = align(f)
+            f.write(data)
+            sections[name] = (start, f.tell() - start)
+
+        write_section('source_offsets', source_offsets.tobytes())
+        write_section('origin_offsets', origin_offsets.tobytes())
+        start = align(f)
+        origins.seek(0)
+        shutil.copyfileobj(origins, f)
+        sections['origin_blob'] = (start, f.tell() - start)
+
+        string_offsets, string_blob = array.array('Q', [0]), bytearray()
+        for string in strings:                              # dicts keep insertion order, which is the order of the ids
+            string_blob += string.encode()
+            string_offsets.append(len(string_blob))
+        write_section('string_offsets', string_offsets.tobytes())
+        write_section('string_blob', bytes(string_blob))
+        for name, column in columns.items():
+            write_section(name, column.tobytes())
+        write_section('fingerprint', bytes(fingerprints))
+
+        f.seek(0)
+        f.write(HEADER.pack(MAGIC, BYTE_ORDER, len(source_offsets) - 1, len(strings), *(value for name in SECTIONS for value in sections[name])))
+    os.replace(temporary, path)
+
+
+class FunctionArchive:
+    # Reader of an archive written by write_function_archive. Every accessor takes the index of a function and only
+    # decodes what it returns; the columns are memoryviews over the mapped file.
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, 'rb')
+        try:
+            self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:                                  # an empty file cannot be mapped
+            self.file.close()
+            raise FunctionArchiveError(f"{path} is not a function archive")
+        self.view = memoryview(self.map)
+        if len(self.map) < HEADER.size or self.map[:len(MAGIC)] != MAGIC:
+            self.close()
+            raise FunctionArchiveError(f"{path} is not a function archive")
+        magic, byte_order, self.count, self.string_count, *bounds = HEADER.unpack_from(self.map)
+        if byte_order != BYTE_ORDER:
+            self.close()
+            raise FunctionArchiveError(f"{path} was written on a machine of the other byte order")
+        self.sections = {name: self.view[bounds[2 * i]:bounds[2 * i] + bounds[2 * i + 1]] for i, name in enumerate(SECTIONS)}
+        self.source_offsets = self.sections['source_offsets'].cast('Q')
+        self.origin_offsets = self.sections['origin_offsets'].cast('Q')
+        self.string_offsets = self.sections['string_offsets'].cast('Q')
+        self.columns = {name: self.sections[name].cast('I') for name in ('name', 'return_type', 'signature', 'flags', 'copies')}
+        self.strings = {}                                   # string id -> decoded string, filled as they are asked for
+
+    def __len__(self):
+        return self.count
+
+    def string(self, string_id):
+        if string_id not in self.strings:
+            self.strings[string_id] = bytes(self.sections['string_blob'][self.string_offsets[string_id]:self.string_offsets[string_id + 1]]).decode()
+        return self.strings[string_id]
+
+    def source(self, i):
+        return bytes(self.sections['source_blob'][self.source_offsets[i]:self.source_offsets[i + 1]]).decode()
+
+    def origins(self, i):
+        return json.loads(bytes(self.sections['origin_blob'][self.origin_offsets[i]:self.origin_offsets[i + 1]]))
+
+    def name(self, i):
+        return self.string(self.columns['name'][i])
+
+    def return_type(self, i):
+        return self.string(self.columns['return_type'][i])
+
+    def params(self, i):                                    # [(name, type)] as extract_function_parameters returns them
+        return [tuple(param) for param in json.loads(self.string(self.columns['signature'][i]))]
+
+    def has_function_call(self, i):
+        return bool(self.columns['flags'][i] & HAS_FUNCTION_CALL)
+
+    def copies(self, i):
+        return self.columns['copies'][i]
+
+    def fingerprint(self, i):
+        return bytes(self.sections['fingerprint'][i * FINGERPRINT_SIZE:(i + 1) * FINGERPRINT_SIZE]).hex()
+
+    def groups(self):
+        # (return type, parameter types) -> indices of the functions, for a FunctionCatalog. Grouped on the id columns,
+        # so only one string per distinct return type and signature is decoded
+        by_ids = {}
+        for i, key in enumerate(zip(self.columns['return_type'], self.columns['signature'])):
+            by_ids.setdefault(key, array.array('I')).append(i)
+        groups = {}
+        for (return_type, signature), indices in by_ids.items():
+            key = (self.string(return_type), tuple(param[1] for param in json.loads(self.string(signature))))
+            groups.setdefault(key, array.array('I')).extend(indices)
+        return groups
+
+    def close(self):                                        # the views have to be released before the map can be closed
+        views = [getattr(self, name, None) for name in ('source_offsets', 'origin_offsets', 'string_offsets')]
+        views += list(getattr(self, 'columns', {}).values()) + list(getattr(self, 'sections', {}).values()) + [self.view]
+        for view in views:
+            if view is not None:
+                view.release()
+        self.map.close()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class ArchivedFunction(dict):
+    # FunctionDB entry backed by an archive: a field is read from the archive, and "source" is parsed, the first time it is used
+    fields = {
+        "source": lambda archive, i: ast.parse(archive.source(i)).body[0],
+        "code": FunctionArchive.source,
+        "name": FunctionArchive.name,
+        "params": FunctionArchive.params,
+        "return_type": FunctionArchive.return_type,
+        "has_function_call": FunctionArchive.has_function_call,
+        "fingerprint": FunctionArchive.fingerprint,
+        "copies": FunctionArchive.copies,
+        "origins": FunctionArchive.origins,
+    }
+
+    def __init__(self, archive, index):
+        super().__init__()
+        self.archive = archive
+        self.index = index
+
+    def __missing__(self, key):
+        if key not in self.fields:
+            raise KeyError(key)
+        self[key] = self.fields[key](self.archive, self.index)
+        return self[key]
+
+    def get(self, key, default=None):                       # dict.get never calls __missing__, so it would not see the archived fields
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+
+class ArchivedFunctionList(collections.abc.Sequence):
+    # function_list of a FunctionDB loaded from an archive. Entries are only created for the functions that are used,
+    # and kept so that what FunctionDB caches in them (hash, compiled function) survives.
+    def __init__(self, archive):
+        self.archive = archive
+        self.entries = {}
+
+    def __len__(self):
+        return len(self.archive)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("function index out of range")
+        if i not in self.entries:
+            self.entries[i] = ArchivedFunction(self.archive, i)
+        return self.entries[i]
@@ -0,0 +1,98 @@
+import inspect
+import random
+
+try:
+    import numpy as np
+except ImportError:                                         # arguments are drawn one at a time with the random module instead
+    np = None
+
+# Arguments for the harvested functions, drawn for a whole batch of calls at once, and the table of what the calls
+# returned. The values follow the ranges the injector always used: ints in [-10000, 10000], floats of magnitude up to
+# 10000, strings of 1 to 15 letters and digits, and bools.
+
+LETTERS = "abcdefghijklmnopqrstuvwxyz123456789"
+MAX_STRING_LENGTH = 15
+
+def draw_values(param_type, n, rng=None):                   # n values for a parameter of type param_type, None for the types that cannot be generated
+    if rng is not None:
+        if param_type == 'int':
+            return rng.integers(-10000, 10001, n).tolist()
+        if param_type == 'float':
+            return (500 * rng.integers(1, 11, n) * (rng.random(n) + rng.random(n)) * (1 - 2 * rng.integers(0, 2, n))).tolist()
+        if param_type == 'bool':
+            return rng.integers(0, 2, n).astype(bool).tolist()
+        if param_type == 'str':                             # a row of letters per value, viewed as one fixed-width string and cut to its length
+            rows = np.array(list(LETTERS))[rng.integers(0, len(LETTERS), (n, MAX_STRING_LENGTH))]
+            words = rows.view(f"<U{MAX_STRING_LENGTH}").ravel().tolist()
+            return [word[:length] for word, length in zip(words, rng.integers(1, MAX_STRING_LENGTH + 1, n).tolist())]
+        return [None] * n
+
+    if param_type == 'int':
+        return [random.randint(-10000, 10000) for _ in range(n)]
+    if param_type == 'float':
+        return [500 * random.randint(1, 10) * (random.random() + random.random()) * (1 - 2 * random.randint(0, 1)) for _ in range(n)]
+    if param_type == 'bool':
+        return [True if random.randint(0, 1) else False for _ in range(n)]
+    if param_type == 'str':
+        return ["".join(random.choices(LETTERS, k=random.randint(1, MAX_STRING_LENGTH))) for _ in range(n)]
+    return [None] * n
+
+def draw_arguments(params, n):
+    # n keyword argument dicts for a function with the given [(name, type)] parameters, one vectorized draw per parameter
+    rng = np.random.default_rng(random.getrandbits(64)) if np is not None else None    # seeded from random so that random.seed still makes runs reproducible
+    columns = [draw_values(param_type, n, rng) for _, param_type in params]
+    names = [name for name, _ in params]
+    return [dict(zip(names, values)) for values in zip(*columns)] if params else [{} for _ in range(n)]
+
+def evaluate_calls(function, calls):                        # [(ok, return value or error)] of function called with each kwargs of calls
+    outcomes = []
+    for kwargs in calls:
+        try:
+            outcomes.append((True, function(**kwargs)))
+        except Exception as e:
+            outcomes.append((False, repr(e)))
+    return outcomes
+
+BATCH_COMPILED = {}
+
+def evaluate_batch(key, source, name, calls):
+    # Runs in a sandbox worker: compiles the function the first time its key is seen and makes every call of the batch.
+    # The whole batch shares the CPU time limit of a sandbox job.
+    if key not in BATCH_COMPILED:
+        namespace = {}
+        exec(compile(source, f"<batch {name}>", "exec"), namespace)
+        BATCH_COMPILED[key] = namespace[name]
+    return evaluate_calls(BATCH_COMPILED[key], calls)
+
+BATCH_EVALUATOR_KEY = "evaluate_batch"
+BATCH_EVALUATOR_SOURCE = "BATCH_COMPILED = {}\n" + inspect.getsource(evaluate_calls) + inspect.getsource(evaluate_batch)    # sent to the workers, which compile it once
+
+
+class ResultTable:
+    # What a function returned over a batch of calls. Results are indexed by type and value, so finding arguments that
+    # make the function return a given constant is a dict lookup; 1, 1.0 and True are kept apart.
+    def __init__(self, outcomes):
+        self.results = []                                   # (kwargs, value) of every call that returned
+        self.by_value = {}                                  # (type, value) -> kwargs of the first call that returned it
+        self.failures = 0
+        for kwargs, (ok, value) in outcomes:
+            if not ok:
+                self.failures += 1
+                continue
+            self.results.append((kwargs, value))
+            try:
+                self.by_value.setdefault((type(value), value), kwargs)
+            except TypeError:                               # unhashable results can still be unified, just not looked up
+                pass
+
+    def __len__(self):
+        return len(self.results)
+
+    def find(self, value):                                  # kwargs of a call that returned value, None if none did
+        try:
+            return self.by_value.get((type(value), value))
+        except TypeError:
+            return None
+
+    def choice(self):                                       # (kwargs, value) of a random call that returned, None if all of them failed
+        return random.choice(self.results) if self.results else None
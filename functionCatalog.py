@@ -0,0 +1,62 @@
+import array
+import bisect
+import random
+
+# Types the injector can generate arguments for, and the return types whose values can stand in for a constant of each
+# type (unify_value rewrites ints from ints, floats from ints and floats, and takes slices of strings). Bools neither
+# take nor stand in for other types: True in place of 1 prints differently, and arithmetic on it makes an int.
+GENERATED_TYPES = ('int', 'float', 'str', 'bool')
+COMPATIBLE_RETURN_TYPES = {
+    bool: ('bool',),
+    int: ('int',),
+    float: ('float', 'int'),
+    str: ('str',),
+}
+
+def group_functions(signatures):                           # groups (index, return type, parameter types) by everything but the index
+    groups = {}
+    for index, return_type, param_types in signatures:
+        groups.setdefault((return_type, tuple(param_types)), array.array('I')).append(index)
+    return groups
+
+
+class FunctionCatalog:
+    # Functions of a FunctionDB indexed by return type and parameter types. A query names the return types it accepts
+    # and the types every parameter must have; its matching groups are found once and kept, so drawing a sample from
+    # it costs O(k log groups) whatever the size of the database.
+    def __init__(self, groups):
+        self.groups = groups                                # (return type, parameter types) -> indices in function_list
+        self.by_return_type = {}
+        for (return_type, param_types), indices in groups.items():
+            self.by_return_type.setdefault(return_type, []).append((param_types, indices))
+        self.selections = {}                                # query -> (matching groups, cumulative sizes)
+
+    def selection(self, return_types, param_types=None):
+        key = (tuple(return_types), None if param_types is None else frozenset(param_types))
+        if key not in self.selections:
+            groups, ends = [], []
+            for return_type in key[0]:
+                for types, indices in self.by_return_type.get(return_type, []):
+                    if indices and (key[1] is None or all(t in key[1] for t in types)):
+                        groups.append(indices)
+                        ends.append((ends[-1] if ends else 0) + len(indices))
+            self.selections[key] = (groups, ends)
+        return self.selections[key]
+
+    def count(self, return_types, param_types=None):
+        ends = self.selection(return_types, param_types)[1]
+        return ends[-1] if ends else 0
+
+    def select(self, return_types, param_types=None):      # every matching index, in catalog order
+        for indices in self.selection(return_types, param_types)[0]:
+            yield from indices
+
+    def sample(self, k, return_types, param_types=None):
+        # up to k distinct matching indices, drawn uniformly with the random module so seeding it makes runs repeatable
+        groups, ends = self.selection(return_types, param_types)
+        total = ends[-1] if ends else 0
+        picks = []
+        for position in random.sample(range(total), min(k, total)):
+            group = bisect.bisect_right(ends, position)
+            picks.append(groups[group][position - (ends[group - 1] if group else 0)])
+        return picks
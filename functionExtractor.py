@@ -1,7 +1,9 @@
-import mysql.connector
-
 import os
+import json
+import asyncio
 import argparse
+import multiprocessing
+import hashlib
 import ast
 import random
 import builtins
@@ -13,6 +15,14 @@ import pathlib
 import decimal
 import fractions
 import functools
+import time
+import concurrent.futures
+
+from functionIndex import FunctionIndex
+from functionStorage import function_stores, open_function_store
+from runMetrics import RunMetrics, collect_metrics, profiling, add_metrics_arguments, export_metrics
+
+run_metrics = RunMetrics()                                  # counted by the process doing the parsing, drained and sent back along with each result
 
 sample_values = {
     'int': 42,
@@ -59,66 +69,6 @@ sample_values = {
     'generator': (x * x for x in range(10)),
 }
 
-def create_database_and_table():
-    # Connect to MySQL
-    connection = mysql.connector.connect(
-        host='localhost',
-        user='root',   # replace with your MySQL username
-        password='root'  # replace with your MySQL password
-    )
-    
-    cursor = connection.cursor()
-
-    # Create database
-    cursor.execute("CREATE DATABASE IF NOT EXISTS function_database")
-    
-    # Use the created database
-    cursor.execute("USE function_database")
-    
-    # Create table
-    cursor.execute("""
-    CREATE TABLE IF NOT EXISTS functions (
-        id INT AUTO_INCREMENT PRIMARY KEY,
-        name VARCHAR(255) NOT NULL,
-        file_name VARCHAR(255) NOT NULL,
-        return_type VARCHAR(255) NOT NULL,
-        has_function_call BOOLEAN NOT NULL,
-        src TEXT NOT NULL
-    )
-    """)
-    
-    # Commit changes
-    connection.commit()
-    cursor.close()
-    connection.close()
-
-
-# Run the function to create the database and table
-create_database_and_table()
-
-
-def insert_function_data(src, function_name, file_name, return_type, has_function_call):
-    connection = mysql.connector.connect(
-        host='localhost',
-        user='root',
-        password='root',
-        database='function_database'
-    )
-    
-    cursor = connection.cursor()
-    
-    cursor.execute("""
-    INSERT INTO functions (src, name, file_name, return_type, has_function_call)
-    VALUES (%s, %s, %s, %s, %s)
-    """, (src, function_name, file_name, return_type, has_function_call))
-    
-    # Commit changes
-    connection.commit()
-    cursor.close()
-    connection.close()
-
-
-
 class FunctionCallChecker(ast.NodeVisitor):
     def __init__(self, function_return_types):
         self.has_function_call = False
@@ -145,24 +95,31 @@ class FunctionCallChecker(ast.NodeVisitor):
 class FunctionExtractor:
     def __init__(self, exclude_integer_parameters=False):
         self.exclude_integer_parameters = exclude_integer_parameters
+        self.parse_error = None                             # why the last file could not be parsed, None if it was
 
     def extract_python_files(self, folder_path):            # extracts python files from directory provided as argument
         all_files = []
         for root, dirs, files in os.walk(folder_path):
-            for file in files:
+            dirs.sort()                                     # in name order, so that the rows are stored in the same order on every file system and with an index
+            for file in sorted(files):
                 if file.endswith(".py"):
                     file_path = os.path.join(root, file)
                     all_files.append(file_path)
         return all_files
     
     def extract_function_declarations(self, file_path):     # extracts the functions found from the python file and returns their ast node    
-        with open(file_path, 'r') as f:
-            code = f.read()
+        start = time.perf_counter()
+        self.parse_error = None
         try:
+            with open(file_path, 'r') as f:
+                code = f.read()
             tree = ast.parse(code)
-        except SyntaxError as e:
-            print(f"Syntax error in file {file_path}: {e}")
+        except (SyntaxError, UnicodeDecodeError, ValueError) as e:     # ValueError: null bytes in the source
+            print(f"Cannot parse file {file_path}: {e}")
+            self.parse_error = e
             return []
+        finally:
+            run_metrics.add_time("parse", time.perf_counter() - start)
         self.functions = [node for node in ast.walk(tree) if isinstance(node, ast.FunctionDef)]
         return self.functions
     
@@ -197,6 +154,13 @@ class FunctionExtractor:
                 flag = True
         return flag
 
+    def integer_rejection_reason(self, function_node):     # why is_integer_function rejects a function, None if it does not
+        if self.is_integer_function(function_node):
+            return None
+        if not function_node.returns or (not self.exclude_integer_parameters and any(not arg.annotation for arg in function_node.args.args)):
+            return UNANNOTATED
+        return NOT_INTEGER
+
 class CallReplacer(ast.NodeTransformer):
     def __init__(self, function_return_types):
         self.function_return_types = function_return_types
@@ -227,51 +191,475 @@ def extract_function_return_types(functions):                # returns the retur
             return_types[function.name] = "Unknown"
     return return_types
 
+FunctionRecord = collections.namedtuple('FunctionRecord', ['src', 'function_name', 'file_name', 'return_type', 'has_function_call', 'fingerprint'])    # compact row sent back by the workers instead of the ast node
+
+BUILTIN_NAMES = frozenset(dir(builtins))
+
+# Reasons a function is left out of the database
+UNANNOTATED = "unannotated"
+NOT_INTEGER = "not integer"
+UNKNOWN_RETURN_TYPE = "unknown return type"
+MISSING_SAMPLE_VALUE = "missing sample value"
+
+CallSite = collections.namedtuple('CallSite', ['name', 'return_type', 'node', 'parent', 'field', 'index', 'enclosing'])    # enclosing is the position of the innermost call site containing this one, if any
+FunctionSummary = collections.namedtuple('FunctionSummary', ['function', 'calls', 'replaceable', 'reason', 'has_function_call'])
+
+def call_name(node):                                         # the name FunctionCallChecker and CallReplacer resolve a Call node to
+    if isinstance(node.func, ast.Name):
+        return node.func.id
+    if isinstance(node.func, ast.Attribute):
+        value = node.func.value
+        if isinstance(value, ast.Name):
+            return f"{value.id}.{node.func.attr}"
+        return node.func.attr
+    return None
+
+def collect_call_sites(function, function_return_types):    # walks the function once and returns every call in it along with where it sits in the tree
+    sites = []
+    stack = [(function, None)]
+    while stack:
+        node, enclosing = stack.pop()
+        for field, value in ast.iter_fields(node):
+            children = enumerate(value) if isinstance(value, list) else [(None, value)]
+            for index, child in children:
+                if not isinstance(child, ast.AST):
+                    continue
+                if isinstance(child, ast.Call):
+                    name = call_name(child)
+                    sites.append(CallSite(name, function_return_types.get(name, "Unknown"), child, node, field, index, enclosing))
+                    stack.append((child, len(sites) - 1))
+                else:
+                    stack.append((child, enclosing))
+    return sites
+
+def analyze_function(extractor, function, function_return_types, check_integer=True):
+    # Single pass replacement for has_function_call, return_function_calls and CallReplacer: the calls are collected in one
+    # walk and the ones with a sample value are swapped in place, so the cost does not depend on how many calls there are.
+    if check_integer:
+        reason = extractor.integer_rejection_reason(function)
+        if reason is not None:
+            return FunctionSummary(function, [], False, reason, None)
+
+    sites = collect_call_sites(function, function_return_types)
+    reason = None
+    replace = False
+    for site in sites:
+        if site.name not in BUILTIN_NAMES:                                      # if the current call in question is not a builtin
+            if site.return_type == "Unknown":                                   # if not then this function is not included in the database
+                reason = reason or UNKNOWN_RETURN_TYPE
+            elif site.return_type not in sample_values:
+                reason = reason or MISSING_SAMPLE_VALUE
+            else:
+                replace = True
+    if reason is not None:
+        return FunctionSummary(function, sites, False, reason, bool(sites))
+
+    removed = []                                                                # whether each call is gone from the rewritten function
+    for site in sites:
+        gone = site.enclosing is not None and removed[site.enclosing]
+        if replace and not gone and site.return_type in sample_values:         # replace the function call with the sample value
+            constant = ast.copy_location(ast.Constant(sample_values[site.return_type]), site.node)
+            if site.index is None:
+                setattr(site.parent, site.field, constant)
+            else:
+                getattr(site.parent, site.field)[site.index] = constant
+            gone = True
+        removed.append(gone)
+    return FunctionSummary(function, sites, True, None, not all(removed))
+
+# Fingerprints: copies of the same function (vendored packages, copied helpers, generated code) hash alike, whatever
+# their locations, docstrings and, with rename_locals, the names of their parameters and local variables.
+DOCUMENTED = (ast.Module, ast.ClassDef, ast.FunctionDef, ast.AsyncFunctionDef)
+NAME_FIELDS = {ast.Name: 'id', ast.arg: 'arg', ast.FunctionDef: 'name', ast.AsyncFunctionDef: 'name', ast.ClassDef: 'name',
+               ast.ExceptHandler: 'name', ast.MatchAs: 'name', ast.MatchStar: 'name', ast.MatchMapping: 'rest'}    # field holding the name a node binds or uses
+
+def is_docstring(node):
+    return isinstance(node, ast.Expr) and isinstance(node.value, ast.Constant) and isinstance(node.value.value, str)
+
+def bound_names(function):                                  # names the function binds itself, except the ones it declares global or nonlocal
+    bound, declared = set(), set()
+    for node in ast.walk(function):
+        if isinstance(node, (ast.Global, ast.Nonlocal)):
+            declared.update(node.names)
+        elif type(node) in NAME_FIELDS and node is not function and not (isinstance(node, ast.Name) and isinstance(node.ctx, ast.Load)):
+            name = getattr(node, NAME_FIELDS[type(node)])
+            if name:
+                bound.add(name)
+    return bound - declared
+
+def canonical_form(node, bound=frozenset(), renames=None):
+    # the node as nested tuples without locations, docstrings and type comments, the names in bound being replaced by the order they first appear in
+    renames = {} if renames is None else renames
+    if isinstance(node, list):
+        return tuple(canonical_form(item, bound, renames) for item in node)
+    if not isinstance(node, ast.AST):
+        return node
+    fields = []
+    for field, value in ast.iter_fields(node):
+        if field == 'type_comment':
+            continue
+        if field == 'body' and isinstance(node, DOCUMENTED) and value and is_docstring(value[0]):
+            value = value[1:]
+        elif field == NAME_FIELDS.get(type(node)) and value in bound:
+            value = renames.setdefault(value, f"_{len(renames)}")
+        fields.append((field, canonical_form(value, bound, renames)))
+    return (type(node).__name__, *fields)
+
+def function_fingerprint(function, rename_locals=False):
+    bound = bound_names(function) if rename_locals else frozenset()
+    return hashlib.sha256(repr(canonical_form(function, bound)).encode()).hexdigest()    # repr keeps 1, 1.0 and True apart
+
+def make_function_record(summary, file_path, function_return_types, rename_locals=False):
+    return FunctionRecord(
+        src=ast.unparse(summary.function),
+        function_name=summary.function.name,
+        file_name=os.path.basename(file_path),
+        return_type=function_return_types.get(summary.function.name, "Unknown"),
+        has_function_call=summary.has_function_call,
+        fingerprint=function_fingerprint(summary.function, rename_locals),
+    )
+
+class FunctionDeduplicator:
+    # Passes on the first record of every fingerprint as a row of the store, and counts the copies that come after it
+    # along with where they were found. Only the counts and the origins are kept, not the records.
+    def __init__(self):
+        self.copies = {}                                    # fingerprint -> number of records seen with it
+        self.origins = {}                                   # fingerprint -> [file name, function name] of each of them
+        self.duplicates = 0
+
+    def unique(self, records):
+        for record in records:
+            record = FunctionRecord._make(record)
+            origin = [record.file_name, record.function_name]
+            if record.fingerprint in self.copies:
+                self.copies[record.fingerprint] += 1
+                self.origins[record.fingerprint].append(origin)
+                self.duplicates += 1
+                continue
+            self.copies[record.fingerprint] = 1
+            self.origins[record.fingerprint] = [origin]
+            yield (*record, 1, json.dumps([origin]))
+
+    def copy_counts(self):                                  # (copies, origins, fingerprint) of the functions found more than once, for FunctionStore.set_copies
+        for fingerprint, copies in self.copies.items():
+            if copies > 1:
+                yield copies, json.dumps(self.origins[fingerprint]), fingerprint
+
+def store_rows(records):                                    # rows of the store for records that are not deduplicated
+    for record in records:
+        record = FunctionRecord._make(record)
+        yield (*record, 1, json.dumps([[record.file_name, record.function_name]]))
+
+# State of a worker process, set once by init_extraction_worker so it is not pickled with every task
+_worker_extractor = None
+_worker_return_types = None
+_worker_rename_locals = False
+
+def init_extraction_worker(exclude_integer_parameters, function_return_types=None, rename_locals=False):
+    global _worker_extractor, _worker_return_types, _worker_rename_locals
+    _worker_extractor = FunctionExtractor(exclude_integer_parameters=exclude_integer_parameters)
+    _worker_return_types = function_return_types
+    _worker_rename_locals = rename_locals
+
+def extract_file_return_types(file_path):                    # first pass: return types of the functions declared in a single file
+    with run_metrics.stage("return_types"):
+        return extract_function_return_types(_worker_extractor.extract_function_declarations(file_path))
+
+def extract_file_entry(file_path):                           # second pass: records of the functions of a single file that make it into the database, along with the return types they depend on
+    records = []
+    dependencies = {}
+    seen = 0
+    with run_metrics.stage("extract"):
+        for function in _worker_extractor.extract_function_declarations(file_path):
+            seen += 1
+            summary = analyze_function(_worker_extractor, function, _worker_return_types)
+            dependencies[function.name] = _worker_return_types.get(function.name, "Unknown")
+            for site in summary.calls:
+                if site.name is not None:
+                    dependencies[site.name] = site.return_type
+            if summary.replaceable:
+                records.append(make_function_record(summary, file_path, _worker_return_types, _worker_rename_locals))
+            else:
+                run_metrics.count("functions_rejected", reason=summary.reason)
+    if _worker_extractor.parse_error is not None:           # counted in this pass only, both of them parse every file
+        run_metrics.count("parse_failures", error=type(_worker_extractor.parse_error).__name__)
+    run_metrics.count("functions_seen", seen)
+    run_metrics.count("functions_extracted", len(records))
+    return file_path, records, dependencies
+
+def extract_file_records(file_path):
+    return extract_file_entry(file_path)[1]
+
+def instrumented(worker, file):                             # result of the worker along with what it counted, drained so that it is sent back only once
+    return worker(file), run_metrics.drain()
+
+def run_extraction_pass(worker, files, initargs, jobs=1, ordered=True, chunksize=16, metrics=None):    # maps a worker over the files, in-process for a single job or sharded over a process pool
+    task = functools.partial(instrumented, worker)
+    if jobs <= 1:
+        init_extraction_worker(*initargs)
+        yield from collect_metrics(map(task, files), metrics)
+        return
+    with multiprocessing.Pool(jobs, initializer=init_extraction_worker, initargs=initargs) as pool:
+        mapper = pool.imap if ordered else pool.imap_unordered
+        yield from collect_metrics(mapper(task, files, chunksize), metrics)
+
+def iter_function_records(files, exclude_integer_parameters=False, jobs=1, chunksize=16, rename_locals=False, metrics=None):
+    # Two passes over the files: the first collects the return types of every function in the corpus (needed to resolve calls
+    # across files), the second filters the functions and streams their records back as each file is done. Only the return
+    # type map is held in memory, never the parsed trees of the whole corpus.
+    function_return_types = {}
+    for return_types in run_extraction_pass(extract_file_return_types, files, (exclude_integer_parameters,), jobs, True, chunksize, metrics):
+        function_return_types.update(return_types)                         # ordered so that later files win, as with a single process
+
+    initargs = (exclude_integer_parameters, function_return_types, rename_locals)
+    for records in run_extraction_pass(extract_file_records, files, initargs, jobs, True, chunksize, metrics):    # ordered so that the copy of a function kept is the first in file order, whatever the timing of the workers
+        yield from records
+
+# Pipeline mode: the same two passes as iter_function_records, run as asyncio stages connected by bounded queues.
+# Directories are listed in a thread while the files already found are parsed in worker processes, and batches of rows
+# are written to the store in a thread while the next ones are extracted. A full queue blocks the stage feeding it,
+# so a slow disk or database holds back the parsing instead of letting rows pile up in memory.
+PIPELINE_DONE = object()                                    # put on a queue by a stage when it has nothing more to send
+
+def scan_directory(path):                                   # (python files, subfolders) of a folder, in name order as extract_python_files lists them
+    files, folders = [], []
+    try:
+        with os.scandir(path) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    folders.append(entry.path)
+                elif entry.name.endswith(".py"):
+                    files.append(entry.path)
+    except OSError:                                         # unreadable folders are skipped, as os.walk does
+        pass
+    return sorted(files), sorted(folders)
+
+def map_files(worker, files):                               # runs in a worker process on a chunk of files, returns the results and what was counted
+    return [worker(file) for file in files], run_metrics.drain()
+
+async def discover_files(folder, sink, chunksize, files=None, scanner=None):
+    # puts chunks of the python files under folder on sink, in the order extract_python_files lists them. Folders are listed in the scanner thread pool
+    loop = asyncio.get_running_loop()
+    pending = [folder]
+    chunk = []
+    while pending:
+        found, folders = await loop.run_in_executor(scanner, scan_directory, pending.pop())
+        pending.extend(reversed(folders))
+        for file in found:
+            if files is not None:
+                files.append(file)
+            chunk.append(file)
+            if len(chunk) >= chunksize:
+                await sink.put(chunk)
+                chunk = []
+    if chunk:
+        await sink.put(chunk)
+    await sink.put(PIPELINE_DONE)
+
+async def feed_files(files, sink, chunksize):               # puts chunks of already known files on sink
+    for start in range(0, len(files), chunksize):
+        await sink.put(files[start:start + chunksize])
+    await sink.put(PIPELINE_DONE)
+
+async def map_stage(worker, source, sink, executor, in_flight, metrics=None):
+    # takes chunks of files from source, runs the worker on them in the executor with at most in_flight chunks at once,
+    # and puts (chunk, results) on sink in the order the chunks came in, so that the first copy of a duplicate function
+    # is the same whatever the timing of the workers
+    loop = asyncio.get_running_loop()
+    running = collections.deque()
+
+    async def forward():
+        chunk, future = running.popleft()
+        results, snapshot = await future
+        if metrics is not None:
+            metrics.merge(snapshot)
+        await sink.put((chunk, results))
+
+    while (chunk := await source.get()) is not PIPELINE_DONE:
+        if len(running) >= in_flight:
+            await forward()
+        running.append((chunk, loop.run_in_executor(executor, map_files, worker, chunk)))
+    while running:
+        await forward()
+    await sink.put(PIPELINE_DONE)
+
+async def write_stage(source, store, rows, writer):
+    # batches the rows of the records on source and writes each batch in the writer thread while the next one fills up
+    loop = asyncio.get_running_loop()
+    batch = []
+    writing = None
+    while (item := await source.get()) is not PIPELINE_DONE:
+        for records in item[1]:
+            batch.extend(rows(records))
+        if len(batch) >= store.batch_size:
+            if writing is not None:
+                await writing
+            writing = loop.run_in_executor(writer, store.write_batch, batch)
+            batch = []
+    if writing is not None:
+        await writing
+    if batch:
+        await loop.run_in_executor(writer, store.write_batch, batch)
+
+def extraction_executor(jobs, initargs):
+    # pool of the worker processes of a pass. Forking a process that runs threads is unsafe, so the workers are all
+    # started here, before the pass starts its threads: with fork the first task launches every worker.
+    methods = multiprocessing.get_all_start_methods()
+    context = multiprocessing.get_context('fork' if 'fork' in methods else None)
+    executor = concurrent.futures.ProcessPoolExecutor(jobs, mp_context=context, initializer=init_extraction_worker, initargs=initargs)
+    executor.submit(int).result()
+    return executor
+
+async def run_extraction_pipeline(folder, store, rows, exclude_integer_parameters=False, jobs=1, chunksize=16, queue_depth=64, rename_locals=False, metrics=None):
+    # extracts the functions of the python files under folder into store, rows turning the records of a file into rows of the store.
+    # queue_depth is the number of chunks each queue holds, two chunks per worker are parsed at once so that none of them waits for work.
+    files = []
+    chunks, results = asyncio.Queue(queue_depth), asyncio.Queue(queue_depth)
+    with extraction_executor(jobs, (exclude_integer_parameters,)) as executor, concurrent.futures.ThreadPoolExecutor(1) as scanner:
+        async def merge_return_types():
+            by_file = {}
+            while (item := await results.get()) is not PIPELINE_DONE:
+                chunk, return_types = item
+                by_file.update(zip(chunk, return_types))
+            return by_file
+        _, _, by_file = await asyncio.gather(discover_files(folder, chunks, chunksize, files, scanner),
+                                             map_stage(extract_file_return_types, chunks, results, executor, 2 * jobs, metrics),
+                                             merge_return_types())
+    function_return_types = {}
+    for file in files:
+        function_return_types.update(by_file[file])         # in discovery order so that later files win, as without the pipeline
+
+    chunks, results = asyncio.Queue(queue_depth), asyncio.Queue(queue_depth)
+    initargs = (exclude_integer_parameters, function_return_types, rename_locals)
+    with extraction_executor(jobs, initargs) as executor, concurrent.futures.ThreadPoolExecutor(1) as writer:
+        await asyncio.gather(feed_files(files, chunks, chunksize),
+                             map_stage(extract_file_records, chunks, results, executor, 2 * jobs, metrics),
+                             write_stage(results, store, rows, writer))
+    return len(files)
+
+def file_content_hash(file_path):
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def refresh_index(index, files, exclude_integer_parameters=False, jobs=1, chunksize=16, rename_locals=False, metrics=None):
+    # Brings the index up to date with the files and returns whether any record changed. Files whose size and mtime
+    # match the index are not read at all, files that were only touched are hashed, and only new or modified files are
+    # parsed. Records of unchanged files are rebuilt only when a return type they were resolved with has changed.
+    indexed = index.files()
+    changed = []
+    for file in files:
+        stat = os.stat(file)
+        entry = indexed.get(file)
+        if entry is not None and entry[0] == stat.st_size and entry[1] == stat.st_mtime_ns:
+            continue
+        content_hash = file_content_hash(file)
+        if entry is not None and entry[2] == content_hash:
+            index.touch(file, stat.st_size, stat.st_mtime_ns)
+            continue
+        changed.append((file, stat.st_size, stat.st_mtime_ns, content_hash))
+
+    deleted = set(indexed) - set(files)
+    for file in deleted:
+        index.remove_file(file)
+
+    changed_files = [file for file, size, mtime, content_hash in changed]
+    return_types = run_extraction_pass(extract_file_return_types, changed_files, (exclude_integer_parameters,), jobs, True, chunksize, metrics)
+    for (file, size, mtime, content_hash), types in zip(changed, return_types):
+        index.update_file(file, size, mtime, content_hash, types)
+
+    function_return_types = {}
+    indexed_return_types = index.return_types()
+    for file in files:
+        function_return_types.update(indexed_return_types[file])      # in file order so that later files win, as without an index
+
+    options_changed = index.get_option('exclude_integer_parameters') != str(exclude_integer_parameters) or index.get_option('rename_locals') != str(rename_locals)
+    indexed_dependencies = index.dependencies()
+    stale = []
+    for file in files:
+        dependencies = indexed_dependencies[file]
+        if options_changed or dependencies is None or any(function_return_types.get(name, "Unknown") != return_type for name, return_type in dependencies.items()):
+            stale.append(file)
+
+    initargs = (exclude_integer_parameters, function_return_types, rename_locals)
+    for file, records, dependencies in run_extraction_pass(extract_file_entry, stale, initargs, jobs, False, chunksize, metrics):
+        index.update_records(file, records, dependencies)
+
+    index.set_option('exclude_integer_parameters', exclude_integer_parameters)
+    index.set_option('rename_locals', rename_locals)
+    index.commit()
+    if metrics is not None:
+        metrics.count("index_files_changed", len(changed))
+        metrics.count("index_files_deleted", len(deleted))
+        metrics.count("index_files_reextracted", len(stale))
+    print(f"Index: {len(changed)} new or changed, {len(deleted)} deleted, {len(stale)} re-extracted, {len(files) - len(changed)} reused")
+    return bool(deleted or stale)
+
+def print_metrics_summary(metrics):
+    rejected = metrics.by_label("functions_rejected", "reason")
+    reasons = ", ".join(f"{count} {reason}" for reason, count in sorted(rejected.items()))
+    print(f"Files: {metrics.value('files_scanned')} scanned, {sum(metrics.by_label('parse_failures', 'error').values())} could not be parsed")
+    print(f"Functions: {metrics.value('functions_seen')} seen, {metrics.value('functions_extracted')} extracted, {sum(rejected.values())} rejected" + (f" ({reasons})" if reasons else ""))
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Extract python files")
     parser.add_argument("-p", "--path", help="Path to the folder to read files from", required=True)
     parser.add_argument('-e', '--exclude-integer-parameters', action='store_true', help='Exclude integer parameters while extracting functions')
+    parser.add_argument('-j', '--jobs', type=int, default=1, help='Number of worker processes used to parse the files (0 uses every core)')
+    parser.add_argument('-s', '--storage', choices=sorted(function_stores), default='mysql', help='Where the extracted functions are stored')
+    parser.add_argument('-d', '--database', help='Database name for MySQL (function_database) or file path for SQLite (function_database.sqlite)')
+    parser.add_argument('-b', '--batch-size', type=int, default=1000, help='Number of rows written per transaction')
+    parser.add_argument('-i', '--index', help='Path to an SQLite index of the extracted files, only new or changed files are parsed again')
+    parser.add_argument('-k', '--keep-duplicates', action='store_true', help='Store every copy of a function instead of only the first one')
+    parser.add_argument('-r', '--rename-locals', action='store_true', help='Count functions that only differ in the names of their parameters and local variables as copies')
+    parser.add_argument('--pipeline', action='store_true', help='Overlap listing, parsing and writing in an asyncio pipeline with bounded queues between the stages')
+    parser.add_argument('-q', '--queue-depth', type=int, default=64, help='Chunks of files each pipeline queue holds before the stage feeding it waits')
+    parser.add_argument('-c', '--chunk-size', type=int, default=16, help='Number of files sent to a worker process at once')
+    add_metrics_arguments(parser)
     args = parser.parse_args()
+    if args.pipeline and args.index:
+        parser.error("--pipeline cannot be used with --index")
 
-    extractor = FunctionExtractor(exclude_integer_parameters=args.exclude_integer_parameters)
-    files = extractor.extract_python_files(args.path)
-    function_database = []
+    jobs = args.jobs if args.jobs > 0 else os.cpu_count()
+    metrics = RunMetrics()
 
-    all_functions = []
-    for file in files:
-        functions = extractor.extract_function_declarations(file)
-        all_functions.extend(functions)
-    
-    function_return_types = extract_function_return_types(all_functions)
-
-    for function in all_functions:
-        flag = True
-        if extractor.is_integer_function(function):                             # if function has integer return types and parameters
-            if extractor.has_function_call(function, function_return_types):    # if function has function call within it
-                calls = extractor.return_function_calls(function, function_return_types)
-                builtins_set = set(dir(builtins))
-                for call, return_type in calls:
-                    if call not in builtins_set:                                # if the current call in question is not a builtin
-                        value_to_be_replaced = None
-                        if return_type != "Unknown":                            # if return type is not unknown then replace the call (if the datatype is in the sample_values dict)
-                            try:
-                                value_to_be_replaced = sample_values[return_type]
-                            except:
-                                flag = False
-                            # Replace the function call with the sample value
-                            replacer = CallReplacer(function_return_types)
-                            function = replacer.visit(function)
-                        else:                                                   # if not then this function is not included in the database
-                            flag = False
-            if flag:
-                function_database.append(function)
-
-    for function in function_database:
-        function_node = function
-        src = ast.unparse(function_node)
-        function_name = function.name
-        file_name = os.path.basename(file)  # Correctly retrieve the file name
-        return_type = function_return_types.get(function.name, "Unknown")
-        has_function_call = extractor.has_function_call(function, function_return_types)
-        
-        insert_function_data(src, function_name, file_name, return_type, has_function_call)
+    with profiling(metrics, args.profile, args.trace_memory):
+        extractor = FunctionExtractor(exclude_integer_parameters=args.exclude_integer_parameters)
+        with metrics.stage("discover"):
+            files = [] if args.pipeline else extractor.extract_python_files(args.path)     # the pipeline lists the files itself
+        deduplicator = FunctionDeduplicator()
+        rows = store_rows if args.keep_duplicates else deduplicator.unique
+
+        with open_function_store(args.storage, args.database, batch_size=args.batch_size) as store:
+            scanned = len(files)
+            if args.index:
+                index = FunctionIndex(args.index)
+                files = [os.path.abspath(file) for file in files]
+                changed = refresh_index(index, files, args.exclude_integer_parameters, jobs, args.chunk_size, args.rename_locals, metrics)
+                # the table is reloaded from the index only when a record changed, or when it is not the table the index last filled the same way
+                target = {'store': store.identity, 'keep_duplicates': args.keep_duplicates}
+                if changed or any(index.get_option(key) != str(value) for key, value in target.items()) or store.count() == 0:
+                    store.clear()
+                    store.insert_many(rows(index.records(files)))
+                    store.flush()
+                for key, value in target.items():
+                    index.set_option(key, value)
+                index.commit()
+                index.close()
+            elif args.pipeline:
+                scanned = asyncio.run(run_extraction_pipeline(args.path, store, rows, args.exclude_integer_parameters, jobs, args.chunk_size, args.queue_depth, args.rename_locals, metrics))
+            else:
+                store.insert_many(rows(iter_function_records(files, args.exclude_integer_parameters, jobs, args.chunk_size, args.rename_locals, metrics)))
+            store.set_copies(deduplicator.copy_counts())
+
+    metrics.merge(run_metrics.drain())
+    metrics.count("files_scanned", scanned)
+    metrics.count("rows_written", store.rows_written)
+    metrics.count("functions_duplicate", deduplicator.duplicates)
+    metrics.add_time("write", store.write_seconds, store.batches_written)
+    print_metrics_summary(metrics)
+    if deduplicator.duplicates:
+        print(f"Duplicates: {deduplicator.duplicates} copies of {sum(1 for copies in deduplicator.copies.values() if copies > 1)} functions were not stored")
+    export_metrics(metrics, args, command="extract", path=args.path, storage=args.storage, jobs=jobs, pipeline=args.pipeline, index=bool(args.index))
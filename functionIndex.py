@@ -0,0 +1,89 @@
+import sqlite3
+import json
+
+
+class FunctionIndex:
+    # On-disk index of an extraction run. For every file it keeps the size, mtime and content hash it was parsed at,
+    # the return types it declares, the return types its records were built from and the records themselves, so a
+    # re-run only has to parse the files that changed.
+    def __init__(self, path="function_index.sqlite"):
+        self.connection = sqlite3.connect(path)
+        self.connection.execute("PRAGMA foreign_keys = ON")
+        columns = [row[1] for row in self.connection.execute("PRAGMA table_info(records)")]
+        if columns and "fingerprint" not in columns:       # written before records had fingerprints, every file is extracted again
+            self.connection.executescript("DROP TABLE records; DROP TABLE files;")
+        self.connection.executescript("""
+        CREATE TABLE IF NOT EXISTS options (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS files (
+            path TEXT PRIMARY KEY,
+            size INTEGER NOT NULL,
+            mtime INTEGER NOT NULL,
+            hash TEXT NOT NULL,
+            return_types TEXT NOT NULL,
+            dependencies TEXT
+        );
+        CREATE TABLE IF NOT EXISTS records (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            path TEXT NOT NULL REFERENCES files(path) ON DELETE CASCADE,
+            src TEXT NOT NULL,
+            name TEXT NOT NULL,
+            file_name TEXT NOT NULL,
+            return_type TEXT NOT NULL,
+            has_function_call BOOLEAN NOT NULL,
+            fingerprint TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS records_path ON records(path);
+        """)
+
+    def get_option(self, key):
+        row = self.connection.execute("SELECT value FROM options WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def set_option(self, key, value):
+        self.connection.execute("INSERT OR REPLACE INTO options (key, value) VALUES (?, ?)", (key, str(value)))
+
+    def files(self):                                        # maps every indexed path to its (size, mtime, hash)
+        return {path: (size, mtime, content_hash) for path, size, mtime, content_hash in self.connection.execute("SELECT path, size, mtime, hash FROM files")}
+
+    def return_types(self):                                 # maps every indexed path to the return types of the functions it declares
+        return {path: json.loads(types) for path, types in self.connection.execute("SELECT path, return_types FROM files")}
+
+    def dependencies(self):                                 # maps every indexed path to the return types its records were built from, None if it has no records yet
+        return {path: json.loads(deps) if deps is not None else None for path, deps in self.connection.execute("SELECT path, dependencies FROM files")}
+
+    def update_file(self, path, size, mtime, content_hash, return_types):    # stores a new version of a file, its records have to be rebuilt afterwards
+        self.connection.execute("DELETE FROM records WHERE path = ?", (path,))
+        self.connection.execute("""
+        INSERT OR REPLACE INTO files (path, size, mtime, hash, return_types, dependencies)
+        VALUES (?, ?, ?, ?, ?, NULL)
+        """, (path, size, mtime, content_hash, json.dumps(return_types)))
+
+    def touch(self, path, size, mtime):                     # the file was rewritten with the same content
+        self.connection.execute("UPDATE files SET size = ?, mtime = ? WHERE path = ?", (size, mtime, path))
+
+    def update_records(self, path, records, dependencies):
+        self.connection.execute("DELETE FROM records WHERE path = ?", (path,))
+        self.connection.executemany("""
+        INSERT INTO records (path, src, name, file_name, return_type, has_function_call, fingerprint)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, [(path, *record) for record in records])
+        self.connection.execute("UPDATE files SET dependencies = ? WHERE path = ?", (json.dumps(dependencies), path))
+
+    def remove_file(self, path):
+        self.connection.execute("DELETE FROM files WHERE path = ?", (path,))
+
+    def records(self, files):                               # (src, name, file_name, return_type, has_function_call, fingerprint) of the functions of files, in the order of files so that the rows are the ones an extraction without an index stores
+        for path in files:
+            for src, name, file_name, return_type, has_function_call, fingerprint in self.connection.execute("""
+            SELECT src, name, file_name, return_type, has_function_call, fingerprint FROM records WHERE path = ? ORDER BY id
+            """, (path,)):
+                yield src, name, file_name, return_type, bool(has_function_call), fingerprint
+
+    def commit(self):
+        self.connection.commit()
+
+    def close(self):
+        self.connection.close()
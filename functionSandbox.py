@@ -0,0 +1,221 @@
+import os
+import time
+import signal
+import collections
+import multiprocessing
+from multiprocessing.connection import wait
+
+try:
+    import resource
+except ImportError:                                         # no rlimits outside of Unix, only the wall clock deadline applies
+    resource = None
+
+SandboxJob = collections.namedtuple('SandboxJob', ['key', 'source', 'name', 'args', 'kwargs'])    # key identifies the source so a worker compiles it only once
+SandboxResult = collections.namedtuple('SandboxResult', ['ok', 'value', 'error', 'message'])      # error is one of the failure kinds below when ok is False
+
+TIMEOUT = "timeout"
+MEMORY = "memory"
+EXCEPTION = "exception"
+CRASH = "crash"
+UNPICKLABLE = "unpicklable"
+
+
+class SandboxTimeout(BaseException):                        # BaseException so that harvested code catching Exception cannot swallow it
+    pass
+
+
+class SandboxError(Exception):
+    def __init__(self, result):
+        super().__init__(f"{result.error}: {result.message}")
+        self.result = result
+
+
+def _raise_timeout(signum, frame):
+    raise SandboxTimeout()
+
+def _address_space():                                       # bytes currently mapped by this process, so the memory limit is on top of what was inherited from the parent
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[0]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return 0
+
+def _cpu_seconds():
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+def _sandbox_worker(connection, memory_limit, isolate_jobs=False):
+    # Loop of a worker process: compiles each function the first time it is asked for it and runs the calls one at a time.
+    # A call gets `timeout` seconds of CPU time through ITIMER_PROF; RLIMIT_CPU is set a second later as a backstop that
+    # kills the worker if the call is stuck where the Python handler cannot run. With isolate_jobs each call runs in a
+    # fork of the worker, which answers and exits: a fork that dies takes the worker down the same way, so the pool
+    # sees what happened as it would without isolation.
+    if isolate_jobs:
+        os.setpgrp()                                        # the pool kills the whole group, the fork running a call included
+    if resource is not None and memory_limit:
+        limit = _address_space() + memory_limit
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGPROF, _raise_timeout)
+    functions = {}
+    worker = os.getpid()
+
+    while True:
+        try:
+            message = connection.recv()
+        except EOFError:
+            break
+        if message is None:
+            break
+        key, source, name, args, kwargs, timeout = message
+        try:
+            if key not in functions:
+                try:
+                    namespace = {}
+                    exec(compile(source, f"<sandbox {name}>", "exec"), namespace)
+                    functions[key] = namespace[name]
+                except Exception as e:                      # remembered, the source is only sent once
+                    functions[key] = e
+            if isinstance(functions[key], Exception):
+                raise functions[key]
+            if isolate_jobs:
+                pid = os.fork()
+                if pid:
+                    status = os.waitstatus_to_exitcode(os.waitpid(pid, 0)[1])
+                    if status < 0:
+                        os.kill(os.getpid(), -status)
+                    if status != 0:
+                        os._exit(status)
+                    continue
+            if resource is not None:
+                soft, hard = resource.getrlimit(resource.RLIMIT_CPU)
+                resource.setrlimit(resource.RLIMIT_CPU, (int(_cpu_seconds() + timeout) + 2, hard))
+            signal.setitimer(signal.ITIMER_PROF, timeout)
+            try:
+                value = functions[key](*args, **kwargs)
+            finally:
+                signal.setitimer(signal.ITIMER_PROF, 0)
+            result = SandboxResult(True, value, None, None)
+        except SandboxTimeout:
+            result = SandboxResult(False, None, TIMEOUT, f"{name} used more than {timeout}s of CPU time")
+        except MemoryError:
+            result = SandboxResult(False, None, MEMORY, f"{name} went over the memory limit")
+        except BaseException as e:
+            result = SandboxResult(False, None, EXCEPTION, repr(e))
+        try:
+            connection.send(result)
+        except Exception as e:
+            connection.send(SandboxResult(False, None, UNPICKLABLE, repr(e)))
+        if isolate_jobs and os.getpid() != worker:
+            os._exit(0)
+
+
+class _SandboxWorker:
+    def __init__(self, context, memory_limit, isolate_jobs=False):
+        self.connection, child = context.Pipe()
+        self.process = context.Process(target=_sandbox_worker, args=(child, memory_limit, isolate_jobs), daemon=True)
+        self.process.start()
+        child.close()
+        self.isolate_jobs = isolate_jobs
+        self.loaded = set()                                 # keys of the functions this worker has compiled
+
+    def kill(self):
+        if self.isolate_jobs:
+            try:
+                os.killpg(self.process.pid, signal.SIGKILL)
+            except OSError:                                 # the worker has not made its group yet, or is already gone
+                pass
+        self.process.kill()
+        self.process.join()
+        self.connection.close()
+
+
+class SandboxPool:
+    # Pool of pre-started worker processes that run harvested functions away from the calling process. Each call is
+    # limited to `timeout` seconds of CPU time and each worker to `memory_limit` extra bytes of address space. A call
+    # that hangs without using CPU is cut off after `wall_timeout` seconds. A worker that dies or is cut off is replaced,
+    # so a bad function only costs its own call. With isolate_jobs every call runs in a fork of its worker, so nothing
+    # a call imports or changes is left for the next one, for the price of a fork per call.
+    def __init__(self, processes=None, timeout=1.0, memory_limit=256 * 1024 * 1024, wall_timeout=None, isolate_jobs=False):
+        methods = multiprocessing.get_all_start_methods()
+        self.context = multiprocessing.get_context('fork' if 'fork' in methods else None)
+        self.processes = processes or os.cpu_count()
+        self.timeout = timeout
+        self.memory_limit = memory_limit
+        self.wall_timeout = wall_timeout or max(4 * timeout, timeout + 1)
+        self.isolate_jobs = isolate_jobs
+        self.workers = [_SandboxWorker(self.context, memory_limit, isolate_jobs) for _ in range(self.processes)]
+
+    def _replace(self, worker):                             # kills a worker and starts a fresh one in its place
+        worker.kill()
+        new_worker = _SandboxWorker(self.context, self.memory_limit, self.isolate_jobs)
+        self.workers[self.workers.index(worker)] = new_worker
+        return new_worker
+
+    def _assign(self, idle, job):                           # prefer a worker that already compiled the function
+        for i, worker in enumerate(idle):
+            if job.key in worker.loaded:
+                return idle.pop(i)
+        return idle.pop()
+
+    def map(self, jobs):                                    # runs the jobs concurrently and returns their SandboxResults in order
+        jobs = list(jobs)
+        results = [None] * len(jobs)
+        pending = collections.deque(range(len(jobs)))
+        idle = list(self.workers)
+        busy = {}                                           # connection -> (worker, job index, wall clock deadline)
+
+        while pending or busy:
+            while idle and pending:
+                index = pending.popleft()
+                job = jobs[index]
+                worker = self._assign(idle, job)
+                source = None if job.key in worker.loaded else job.source
+                worker.connection.send((job.key, source, job.name, tuple(job.args), dict(job.kwargs or {}), self.timeout))
+                worker.loaded.add(job.key)
+                busy[worker.connection] = (worker, index, time.monotonic() + self.wall_timeout)
+
+            deadline = min(entry[2] for entry in busy.values())
+            for connection in wait(list(busy), timeout=max(deadline - time.monotonic(), 0)):
+                worker, index, _ = busy.pop(connection)
+                try:
+                    results[index] = connection.recv()
+                    idle.append(worker)
+                except (EOFError, OSError):
+                    worker.process.join()
+                    exitcode = worker.process.exitcode
+                    if exitcode == -getattr(signal, 'SIGXCPU', 0):
+                        results[index] = SandboxResult(False, None, TIMEOUT, f"{jobs[index].name} was killed at the CPU time limit")
+                    else:
+                        results[index] = SandboxResult(False, None, CRASH, f"worker exited with code {exitcode}")
+                    idle.append(self._replace(worker))
+
+            now = time.monotonic()
+            for connection, (worker, index, deadline) in list(busy.items()):
+                if now >= deadline:
+                    del busy[connection]
+                    results[index] = SandboxResult(False, None, TIMEOUT, f"{jobs[index].name} did not return within {self.wall_timeout}s")
+                    idle.append(self._replace(worker))
+        return results
+
+    def call(self, key, source, name, args=(), kwargs=None):
+        return self.map([SandboxJob(key, source, name, args, kwargs)])[0]
+
+    def close(self):
+        for worker in self.workers:
+            try:
+                worker.connection.send(None)
+            except OSError:
+                pass
+        for worker in self.workers:
+            worker.process.join(1)
+            if worker.process.is_alive():
+                worker.process.kill()
+            worker.connection.close()
+        self.workers = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
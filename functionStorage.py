@@ -0,0 +1,268 @@
+import os
+import time
+import queue
+import sqlite3
+import threading
+import contextlib
+
+
+class ConnectionPool:
+    # Hands out at most `size` connections created lazily with `connect`, and reuses them once they are released
+    def __init__(self, connect, size=4):
+        self.connect = connect
+        self.size = size
+        self.idle = queue.LifoQueue()
+        self.created = 0
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        try:
+            return self.idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self.lock:
+            create = self.created < self.size
+            if create:
+                self.created += 1
+        if create:
+            try:
+                return self.connect()
+            except:
+                with self.lock:
+                    self.created -= 1
+                raise
+        return self.idle.get()                              # every connection is in use, wait for one to be released
+
+    def release(self, connection):
+        self.idle.put(connection)
+
+    @contextlib.contextmanager
+    def connection(self):
+        connection = self.acquire()
+        try:
+            yield connection
+        finally:
+            self.release(connection)
+
+    def close(self):
+        while True:
+            try:
+                connection = self.idle.get_nowait()
+            except queue.Empty:
+                break
+            connection.close()
+            with self.lock:
+                self.created -= 1
+
+
+class FunctionStore:
+    # Storage of the extracted function records. Records are buffered and written with executemany, one transaction
+    # per batch of `batch_size` rows, over connections taken from a pool. The schema is created the first time a
+    # connection is used, not when the store is created.
+    placeholder = '?'
+    columns = ('src', 'name', 'file_name', 'return_type', 'has_function_call', 'fingerprint', 'copies', 'origins')
+    schema = []
+    added_columns = {}                                      # column -> statements adding it to a functions table created before it existed
+    indexes = []                                            # created once the table has every column
+
+    def __init__(self, batch_size=1000, pool_size=4):
+        self.batch_size = batch_size
+        self.pool = ConnectionPool(self.connect, pool_size)
+        self.pending = []
+        self.schema_ready = False
+        self.rows_written = 0
+        self.batches_written = 0
+        self.write_seconds = 0.0                            # time spent in write_batch, for the metrics of the run
+
+    def connect(self):
+        raise NotImplementedError
+
+    @property
+    def identity(self):                                     # names the table the records go to, so that an index knows which store it last filled
+        raise NotImplementedError
+
+    def table_columns(self, cursor):                        # names of the columns the functions table has
+        raise NotImplementedError
+
+    def migrate(self, cursor):                              # CREATE TABLE IF NOT EXISTS leaves a table of an earlier version as it is, its missing columns are added here
+        columns = self.table_columns(cursor)
+        for column, statements in self.added_columns.items():
+            if column not in columns:
+                for statement in statements:
+                    cursor.execute(statement)
+
+    @property
+    def insert_statement(self):
+        return f"INSERT INTO functions ({', '.join(self.columns)}) VALUES ({', '.join([self.placeholder] * len(self.columns))})"
+
+    @contextlib.contextmanager
+    def transaction(self):
+        with self.pool.connection() as connection:
+            cursor = connection.cursor()
+            try:
+                if not self.schema_ready:
+                    for statement in self.schema:
+                        cursor.execute(statement)
+                    self.migrate(cursor)
+                    for statement in self.indexes:
+                        cursor.execute(statement)
+                    self.schema_ready = True
+                yield cursor
+                connection.commit()
+            except:
+                connection.rollback()
+                raise
+            finally:
+                cursor.close()
+
+    def insert(self, record):                               # record is (src, name, file_name, return_type, has_function_call, fingerprint, copies, origins)
+        self.pending.append(tuple(record))
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+
+    def insert_many(self, records):
+        for record in records:
+            self.insert(record)
+
+    def flush(self):
+        if self.pending:
+            rows, self.pending = self.pending, []
+            self.write_batch(rows)
+
+    def write_batch(self, rows):                            # writes the rows in a single transaction, bypassing the buffer
+        start = time.perf_counter()
+        with self.transaction() as cursor:
+            cursor.executemany(self.insert_statement, rows)
+        self.write_seconds += time.perf_counter() - start
+        self.rows_written += len(rows)
+        self.batches_written += 1
+
+    def set_copies(self, rows):                             # rows are (copies, origins, fingerprint) of the functions stored once for several copies
+        rows = list(rows)
+        self.flush()
+        if rows:
+            with self.transaction() as cursor:
+                cursor.executemany(f"UPDATE functions SET copies = {self.placeholder}, origins = {self.placeholder} WHERE fingerprint = {self.placeholder}", rows)
+
+    def count(self):                                        # number of stored records, flushing the buffered ones first
+        self.flush()
+        with self.transaction() as cursor:
+            cursor.execute("SELECT COUNT(*) FROM functions")
+            return cursor.fetchone()[0]
+
+    def clear(self):                                        # drops every stored record, including the ones not flushed yet
+        self.pending = []
+        with self.transaction() as cursor:
+            cursor.execute("DELETE FROM functions")
+
+    def close(self):
+        self.flush()
+        self.pool.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is not None:
+            self.pending = []                               # do not write a partial batch of a failed run
+        self.close()
+
+
+class SQLiteFunctionStore(FunctionStore):
+    schema = ["""
+    CREATE TABLE IF NOT EXISTS functions (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name VARCHAR(255) NOT NULL,
+        file_name VARCHAR(255) NOT NULL,
+        return_type VARCHAR(255) NOT NULL,
+        has_function_call BOOLEAN NOT NULL,
+        src TEXT NOT NULL,
+        fingerprint CHAR(64) NOT NULL,
+        copies INTEGER NOT NULL DEFAULT 1,
+        origins TEXT NOT NULL
+    )
+    """]
+    added_columns = {
+        'fingerprint': ["ALTER TABLE functions ADD COLUMN fingerprint CHAR(64) NOT NULL DEFAULT ''"],
+        'copies': ["ALTER TABLE functions ADD COLUMN copies INTEGER NOT NULL DEFAULT 1"],
+        'origins': ["ALTER TABLE functions ADD COLUMN origins TEXT NOT NULL DEFAULT '[]'"],
+    }
+    indexes = ["CREATE INDEX IF NOT EXISTS functions_fingerprint ON functions(fingerprint)"]
+
+    def __init__(self, path="function_database.sqlite", batch_size=1000, pool_size=4):
+        self.path = path
+        super().__init__(batch_size, pool_size)
+
+    def connect(self):
+        return sqlite3.connect(self.path, timeout=60, check_same_thread=False)
+
+    @property
+    def identity(self):
+        return f"sqlite:{os.path.abspath(self.path)}"
+
+    def table_columns(self, cursor):
+        cursor.execute("PRAGMA table_info(functions)")
+        return {row[1] for row in cursor.fetchall()}
+
+
+class MySQLFunctionStore(FunctionStore):
+    placeholder = '%s'
+    schema = ["""
+    CREATE TABLE IF NOT EXISTS functions (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        name VARCHAR(255) NOT NULL,
+        file_name VARCHAR(255) NOT NULL,
+        return_type VARCHAR(255) NOT NULL,
+        has_function_call BOOLEAN NOT NULL,
+        src TEXT NOT NULL,
+        fingerprint CHAR(64) NOT NULL,
+        copies INT NOT NULL DEFAULT 1,
+        origins TEXT NOT NULL,
+        INDEX (fingerprint)
+    )
+    """]
+    added_columns = {
+        'fingerprint': ["ALTER TABLE functions ADD COLUMN fingerprint CHAR(64) NOT NULL DEFAULT '', ADD INDEX (fingerprint)"],
+        'copies': ["ALTER TABLE functions ADD COLUMN copies INT NOT NULL DEFAULT 1"],
+        'origins': ["ALTER TABLE functions ADD COLUMN origins TEXT", "UPDATE functions SET origins = '[]'", "ALTER TABLE functions MODIFY origins TEXT NOT NULL"],    # TEXT columns cannot have a default
+    }
+
+    def __init__(self, database="function_database", host='localhost', user='root', password='root', batch_size=1000, pool_size=4):
+        import mysql.connector                              # only needed when storing to MySQL
+        self.connector = mysql.connector
+        self.database = database
+        self.host = host
+        self.user = user                                    # replace with your MySQL username
+        self.password = password                            # replace with your MySQL password
+        self.database_ready = False
+        super().__init__(batch_size, pool_size)
+
+    def connect(self):
+        if not self.database_ready:
+            connection = self.connector.connect(host=self.host, user=self.user, password=self.password)
+            cursor = connection.cursor()
+            cursor.execute(f"CREATE DATABASE IF NOT EXISTS {self.database}")
+            cursor.close()
+            connection.close()
+            self.database_ready = True
+        return self.connector.connect(host=self.host, user=self.user, password=self.password, database=self.database)
+
+    @property
+    def identity(self):
+        return f"mysql:{self.host}/{self.database}"
+
+    def table_columns(self, cursor):
+        cursor.execute("SHOW COLUMNS FROM functions")
+        return {row[0] for row in cursor.fetchall()}
+
+
+function_stores = {
+    'mysql': MySQLFunctionStore,
+    'sqlite': SQLiteFunctionStore,
+}
+
+def open_function_store(kind, database=None, **options):   # creates the store registered under `kind`, using its default database when none is given
+    store_class = function_stores[kind]
+    if database is None:
+        return store_class(**options)
+    return store_class(database, **options)
@@ -0,0 +1,372 @@
+import io
+import os
+import ast
+import sys
+import copy
+import json
+import time
+import random
+import argparse
+import platform
+import tempfile
+import contextlib
+import subprocess
+
+import functionExtractor
+import pythonMutator
+
+# Benchmarks of the hot paths: parsing and filtering the corpus, the mutation operators, undoing mutations and tracing
+# a function for the variable injector. Every benchmark reports the best of `repeat` runs, which is the least noisy
+# figure on a shared machine, and the results are written as JSON so that two commits can be compared with --compare.
+
+# Realistic fixture: the circuit delay program the notebook mutates
+CIRCUIT_DELAY_PROGRAM = r'''
+with open("circuit.txt", "r") as F:
+    circuit = F.readlines()
+with open("gate_delays.txt", "r") as F:
+    delays = F.readlines()
+
+gates = {-1: 0}
+nodes = {}
+out_nodes = []
+flag1 = flag2 = flag3 = False
+
+for i in delays:
+    x = i.strip()
+    if x[:2] == "//": continue
+    if len(x) == 0: continue
+    inps = x.split()
+    gates[inps[0]] = float(inps[1])
+
+for i in circuit:
+    x = i.strip()
+    if x[:2] == "//": continue
+    if len(x) == 0: continue
+    inps = x.split()
+    if inps[0] == "PRIMARY_INPUTS":
+        for j in inps[1:]:
+            nodes[j] = [0, [], -1]
+        flag1 = True
+        continue
+    if inps[0] == "INTERNAL_SIGNALS":
+        for j in inps[1:]:
+            nodes[j] = [0, [], -1]
+        flag2 = True
+        continue
+    if inps[0] == "PRIMARY_OUTPUTS":
+        for j in inps[1:]:
+            nodes[j] = [0, [], -1]
+        out_nodes.extend(inps[1:])
+        flag3 = True
+        continue
+    if flag1 and flag2 and flag3: break
+
+for i in circuit:
+    x = i.strip()
+    if x[:2] == "//": continue
+    if len(x) == 0: continue
+    inps = x.split()
+    if ((inps[0]=="PRIMARY_INPUTS") or (inps[0]=="INTERNAL_SIGNALS") or (inps[0]=="PRIMARY_OUTPUTS")):
+        continue
+    out = inps[-1]
+    nodes[out][1].extend(inps[1:-1])
+    nodes[out][2] = inps[0]
+
+def calcVal_A(x):
+    if nodes[x][1] == []: return nodes[x][0]
+    s = 0
+    for i in nodes[x][1]:
+        nodes[i][0] = calcVal_A(i)
+        s = max(nodes[i][0], s)
+    nodes[x][1] = []
+    return s + gates[nodes[x][2]]
+
+to_write = []
+
+for i in out_nodes:
+    nodes[i][0] = calcVal_A(i)
+    if nodes[i][0] == round(nodes[i][0]): nodes[i][0] = round(nodes[i][0])
+    to_write.append(i + " " + str(nodes[i][0]) + "\n")
+
+with open("output_delays.txt", "w") as F:
+    F.writelines(to_write)
+'''
+
+# Function the tracing benchmark profiles: a loop over a few locals, so every line is hit many times
+TRACING_FIXTURE = '''
+def pymutator_benchmark_function():
+    total = 0
+    weights = [3, 1, 4, 1, 5, 9, 2, 6]
+    scale = 2.5
+    for i in range(2000):
+        w = weights[i % 8]
+        total += w * 7 - 2
+        if total > 100000:
+            total = total // 3
+    name = "benchmark" + str(total)
+    return total * scale, name
+'''
+
+
+def synthetic_function(rng, name, callees, call_density, annotated=True):
+    # source of a function with constants, a range loop and on average call_density calls to the callees
+    lines = [f"def {name}(a: int, b: int) -> int:" if annotated else f"def {name}(a, b):",
+             f"    x = a * {rng.randint(1, 99)} + {rng.randint(0, 999)}",
+             f"    for i in range({rng.randint(2, 20)}):",
+             f"        x += i * {rng.randint(1, 9)} - b"]
+    calls = int(call_density) + (rng.random() < call_density - int(call_density))
+    for _ in range(calls):
+        callee = rng.choice(callees)
+        lines.append("    x = x + abs(x - b)" if callee == "abs" else f"    x = x + {callee}(x, b)")
+    lines.append(f"    return x % {rng.randint(100, 10000)}")
+    return "\n".join(lines)
+
+def write_synthetic_corpus(folder, files=50, functions=20, call_density=0.5, seed=0, annotated_ratio=0.8):
+    # writes `files` modules of `functions` functions each and returns their paths. A function calls functions of the
+    # modules written before it, some of them unannotated, and now and then a name defined nowhere, so that filtering
+    # has every kind of call to resolve.
+    rng = random.Random(seed)
+    os.makedirs(folder, exist_ok=True)
+    paths, callees = [], []
+    for f in range(files):
+        sources = []
+        for k in range(functions):
+            name = f"f{f}_{k}"
+            targets = callees[-200:] + ["abs", "undefined_helper"]
+            sources.append(synthetic_function(rng, name, targets, call_density, rng.random() < annotated_ratio))
+            callees.append(name)
+        path = os.path.join(folder, f"module_{f}.py")
+        with open(path, 'w', encoding="utf8") as out:
+            out.write("\n\n".join(sources) + "\n")
+        paths.append(path)
+    return paths
+
+
+def best_of(setup, run, repeat):
+    # (items, seconds) of the fastest of `repeat` runs, setup making the fresh input of each run outside of the timing
+    best = None
+    for _ in range(repeat):
+        state = setup()
+        start = time.perf_counter()
+        items = run(state)
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best[1]:
+            best = (items, elapsed)
+    return best
+
+def result(name, items, seconds, unit, **params):           # value is the rate, items per second of the best run
+    return {"name": name, "items": items, "seconds": seconds, "value": items / seconds if seconds else float("inf"), "unit": unit, "params": params}
+
+@contextlib.contextmanager
+def quiet():                                                # the extractor prints the files it cannot parse
+    with contextlib.redirect_stdout(io.StringIO()):
+        yield
+
+
+def bench_extraction(paths, repeat):
+    extractor = functionExtractor.FunctionExtractor()
+    def run(_):
+        with quiet():
+            for path in paths:
+                extractor.extract_function_declarations(path)
+        return len(paths)
+    items, seconds = best_of(lambda: None, run, repeat)
+    return [result("extraction.parse", items, seconds, "files/s", files=len(paths))]
+
+def corpus_functions(paths):                                # (functions, return types of the corpus), parsed fresh
+    extractor = functionExtractor.FunctionExtractor()
+    functions = []
+    with quiet():
+        for path in paths:
+            functions.extend(extractor.extract_function_declarations(path))
+    return functions, functionExtractor.extract_function_return_types(functions)
+
+def bench_filtering(paths, repeat):
+    extractor = functionExtractor.FunctionExtractor()
+    def filtering(state):
+        functions, return_types = state
+        for function in functions:
+            functionExtractor.analyze_function(extractor, function, return_types)
+        return len(functions)
+    def replacing(state):
+        functions, return_types = state
+        replacer = functionExtractor.CallReplacer(return_types)
+        for function in functions:
+            replacer.visit(function)
+        return len(functions)
+    results = []
+    for name, run in (("extraction.filter", filtering), ("extraction.call_replacer", replacing)):
+        items, seconds = best_of(lambda: corpus_functions(paths), run, repeat)
+        results.append(result(name, items, seconds, "functions/s", files=len(paths)))
+    return results
+
+def operator_fixture(paths):                                # the circuit program followed by a synthetic module, which has range loops
+    with open(paths[0], 'r', encoding="utf8") as f:
+        return CIRCUIT_DELAY_PROGRAM + "\n" + f.read()
+
+def bench_operators(source, repeat, rounds=10, seed=0):
+    tree = ast.parse(source)
+    results = []
+    for operator in pythonMutator.OPERATORS:
+        def setup():
+            random.seed(seed)
+            return pythonMutator.PythonMutator(), copy.deepcopy(tree)
+        def run(state):
+            pm, mutated = state
+            for _ in range(rounds):
+                getattr(pm, operator)(mutated)
+            return len(pm.mutations)
+        items, seconds = best_of(setup, run, repeat)
+        results.append(result(f"mutation.{operator}", items, seconds, "mutations/s", rounds=rounds))
+    return results
+
+def bench_reversal(source, repeat, lengths=(10, 100, 1000), seed=0):
+    # reverse_mutation against the length of the history: the latency of undoing the last `length` mutations one at a time
+    tree = ast.parse(source)
+    results = []
+    for length in lengths:
+        def setup():
+            random.seed(seed)
+            pm, mutated = pythonMutator.PythonMutator(), copy.deepcopy(tree)
+            while len(pm.mutations) < length:
+                before = len(pm.mutations)
+                pm.expand_constants(mutated)
+                pm.swap_numbers(mutated)
+                if len(pm.mutations) == before:
+                    break
+            return pm
+        def run(pm):
+            count = min(length, len(pm.mutations))
+            for _ in range(count):
+                pm.reverse_mutation()
+            return count
+        items, seconds = best_of(setup, run, repeat)
+        results.append(result(f"reversal.history_{length}", items, seconds, "reversals/s", history=length))
+    return results
+
+def load_notebook(path, required=()):
+    # the definitions of the notebook (imports, functions, classes and assignments of its code cells), run in a scratch
+    # folder with their output hidden; the demo statements are left out. Assignments that need them fail and are
+    # reported as skipped, any other failure is an error, as is a name of required the notebook did not define.
+    keep = (ast.Import, ast.ImportFrom, ast.FunctionDef, ast.ClassDef, ast.Assign, ast.Try)
+    with open(path, 'r', encoding="utf8") as f:
+        cells = [(number, ''.join(cell['source'])) for number, cell in enumerate(json.load(f)['cells']) if cell['cell_type'] == 'code']
+    namespace = {"__name__": "__notebook__"}
+    folder = os.path.dirname(os.path.abspath(path))
+    sys.path.insert(0, folder)
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as scratch, quiet():
+        os.chdir(scratch)
+        try:
+            for number, source in cells:
+                try:
+                    module = ast.parse(source)
+                except SyntaxError as e:
+                    print(f"Skipped notebook cell {number}: {e}", file=sys.stderr)
+                    continue
+                for statement in module.body:
+                    if isinstance(statement, keep):
+                        try:
+                            exec(compile(ast.Module(body=[statement], type_ignores=[]), f"<notebook cell {number}>", "exec"), namespace)
+                        except Exception as e:
+                            if not isinstance(statement, ast.Assign):    # a definition that did not load would leave a missing or stale symbol to measure
+                                raise RuntimeError(f"Notebook cell {number}, line {statement.lineno} failed: {e!r}") from e
+                            print(f"Skipped notebook cell {number}, line {statement.lineno}: {e!r}", file=sys.stderr)
+        finally:
+            os.chdir(cwd)
+    missing = [name for name in required if name not in namespace]
+    if missing:
+        raise RuntimeError(f"The notebook does not define {', '.join(missing)}")
+    return namespace
+
+def bench_tracing(notebook, repeat, snapshots_per_line=(1, 4)):
+    # overhead of VariableInjector.profile_function, which runs the function under the line tracer, over a plain call
+    namespace = load_notebook(notebook, required=("VariableInjector",))
+    exec(TRACING_FIXTURE, namespace)
+    f = namespace["pymutator_benchmark_function"]
+    fn_tree = ast.parse(TRACING_FIXTURE).body[0]
+    _, plain = best_of(lambda: None, lambda _: f() and 1, repeat)
+    results = [result("tracing.plain_call", 1, plain, "calls/s")]
+    for snapshots in snapshots_per_line:
+        def run(_):
+            namespace["VariableInjector"]().profile_function(f, copy.deepcopy(fn_tree), snapshots)
+            return 1
+        _, traced = best_of(lambda: None, run, repeat)
+        entry = result(f"tracing.profile_function_{snapshots}", 1, traced, "calls/s", snapshots_per_line=snapshots)
+        entry["overhead"] = traced / plain
+        results.append(entry)
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=os.path.dirname(os.path.abspath(__file__)),
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare(old, new):                                      # prints every benchmark of both runs with the ratio of its rate
+    previous = {entry["name"]: entry for entry in old["results"]}
+    print(f"{'benchmark':40} {'before':>14} {'after':>14} {'ratio':>8}")
+    for entry in new["results"]:
+        if entry["name"] in previous:
+            before = previous[entry["name"]]["value"]
+            print(f"{entry['name']:40} {before:14.1f} {entry['value']:14.1f} {entry['value'] / before:8.2f}  {entry['unit']}")
+
+BENCHMARKS = ('extraction', 'filtering', 'operators', 'reversal', 'tracing')
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the extraction, mutation, reversal and tracing hot paths")
+    parser.add_argument("-o", "--output", default="benchmark_results.json", help="File the results are written to as JSON")
+    parser.add_argument("--compare", help="Results of an earlier run to compare this one to")
+    parser.add_argument("-b", "--benchmarks", default=",".join(BENCHMARKS), help=f"Comma separated benchmarks to run, out of {', '.join(BENCHMARKS)}")
+    parser.add_argument("-f", "--files", type=int, default=50, help="Number of files of the synthetic corpus")
+    parser.add_argument("-m", "--functions", type=int, default=20, help="Number of functions per synthetic file")
+    parser.add_argument("-d", "--call-density", type=float, default=0.5, help="Average number of calls per synthetic function")
+    parser.add_argument("-r", "--repeat", type=int, default=3, help="Number of runs of every benchmark, the fastest one is kept")
+    parser.add_argument("-s", "--seed", type=int, default=0, help="Seed of the corpus and of the mutations")
+    parser.add_argument("--notebook", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "Mutator.ipynb"), help="Notebook the tracing benchmark loads VariableInjector from")
+    args = parser.parse_args()
+
+    selected = [name.strip() for name in args.benchmarks.split(",") if name.strip()]
+    for name in selected:
+        if name not in BENCHMARKS:
+            parser.error(f"unknown benchmark {name}")
+
+    results = []
+    with tempfile.TemporaryDirectory() as folder:
+        paths = write_synthetic_corpus(folder, args.files, args.functions, args.call_density, args.seed)
+        fixture = operator_fixture(paths)
+        if 'extraction' in selected:
+            results += bench_extraction(paths, args.repeat)
+        if 'filtering' in selected:
+            results += bench_filtering(paths, args.repeat)
+        if 'operators' in selected:
+            results += bench_operators(fixture, args.repeat, seed=args.seed)
+        if 'reversal' in selected:
+            results += bench_reversal(fixture, args.repeat, seed=args.seed)
+        if 'tracing' in selected:
+            results += bench_tracing(args.notebook, args.repeat)
+
+    run = {
+        "meta": {
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "numpy": pythonMutator.np is not None,
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "corpus": {"files": args.files, "functions": args.functions, "call_density": args.call_density, "seed": args.seed},
+            "repeat": args.repeat,
+        },
+        "results": results,
+    }
+    with open(args.output, 'w', encoding="utf8") as f:
+        json.dump(run, f, indent=2)
+
+    for entry in results:
+        overhead = f"  ({entry['overhead']:.1f}x a plain call)" if "overhead" in entry else ""
+        print(f"{entry['name']:40} {entry['value']:14.1f} {entry['unit']}{overhead}")
+    if args.compare:
+        with open(args.compare, 'r', encoding="utf8") as f:
+            compare(json.load(f), run)
@@ -0,0 +1,756 @@
+import os
+import ast
+import copy
+import gzip
+import json
+import math
+import random
+import string
+import hashlib
+import argparse
+import collections
+import multiprocessing
+
+from runMetrics import RunMetrics, collect_metrics, profiling, add_metrics_arguments, export_metrics
+
+try:
+    import numpy as np
+except ImportError:                                         # candidates are drawn one at a time with the random module instead
+    np = None
+
+run_metrics = RunMetrics()                                  # counted by the process generating mutants, drained and sent back along with each task
+
+# The tree mutators of Mutator.ipynb, the ones that only need the tree and not to run it, gathered in a module so that
+# worker processes can import them. The notebook walks through how each of them works.
+
+op_map_int = [("+", ast.Add()), ("*", ast.Mult()), ("//", ast.FloorDiv()), ("-", ast.Sub())]
+op_map_float = [("+", ast.Add()), ("*", ast.Mult()), ("/", ast.Div()), ("-", ast.Sub())]
+
+Edit = collections.namedtuple('Edit', ['parent', 'field', 'index', 'old', 'new'])   # index is None when the field holds a single node, else old and new are tuples of the nodes at that position
+
+def apply_edit(edit):
+    if edit.index is None:
+        setattr(edit.parent, edit.field, edit.new)
+    else:
+        getattr(edit.parent, edit.field)[edit.index:edit.index + len(edit.old)] = edit.new
+
+def revert_edit(edit):
+    if edit.index is None:
+        setattr(edit.parent, edit.field, edit.old)
+    else:
+        getattr(edit.parent, edit.field)[edit.index:edit.index + len(edit.new)] = edit.old
+
+
+class MutationJournal:
+    # Mutations applied to a tree, in order. Undoing and redoing them only touches the fields they edited, so it takes
+    # the same time whatever the size of the tree. Mutations have to be undone in the reverse order they were made in,
+    # since the positions in the edits are only valid in the tree the mutation was made on.
+    def __init__(self):
+        self.done = []
+        self.undone = []                                    # mutations undone since the last new one, redo takes them back from the end
+
+    def __len__(self):
+        return len(self.done)
+
+    def __getitem__(self, index):
+        return self.done[index]
+
+    def __iter__(self):
+        return iter(self.done)
+
+    def append(self, mutation):                             # records a mutation that was already applied
+        self.done.append(tuple(mutation))
+        self.undone = []
+
+    def extend(self, mutations):
+        for mutation in mutations:
+            self.append(mutation)
+
+    def undo(self):
+        mutation = self.done.pop()
+        for edit in reversed(mutation):
+            revert_edit(edit)
+        self.undone.append(mutation)
+        return mutation
+
+    def redo(self):
+        mutation = self.undone.pop()
+        for edit in mutation:
+            apply_edit(edit)
+        self.done.append(mutation)
+        return mutation
+
+    def checkpoint(self):
+        return len(self.done)
+
+    def rollback(self, checkpoint):                         # undoes every mutation made since the checkpoint, returns them in the order they were undone
+        return [self.undo() for _ in range(len(self.done) - checkpoint)]
+
+
+class MutationTransformer(ast.NodeTransformer):
+    # NodeTransformer that records in self.mutations every node a visit replaces, along with where it was
+    sites = None                                            # SiteIndex of the tree being mutated, told about every edit
+
+    def site_index(self, src):
+        if self.sites is None or self.sites.root is not src:
+            self.sites = SiteIndex(src)
+        return self.sites
+
+    def record(self, edits):
+        self.mutations.append(edits)
+        if self.sites is not None:
+            self.sites.update(edits)
+
+    def apply(self, *edits):                                # applies edits to the tree and records them as one mutation
+        for edit in edits:
+            apply_edit(edit)
+        self.record(edits)
+
+    def visit_field(self, node, field):
+        old_value = getattr(node, field)
+        new_value = self.visit(old_value)
+        if new_value is not old_value:
+            self.apply(Edit(node, field, None, old_value, new_value))
+
+    def generic_visit(self, node):
+        for field, old_value in ast.iter_fields(node):
+            if isinstance(old_value, list):
+                new_values = []
+                for value in old_value:
+                    if isinstance(value, ast.AST):
+                        new_value = self.visit(value)
+                        if new_value is not value:
+                            new_value = () if new_value is None else tuple(new_value) if isinstance(new_value, list) else (new_value,)
+                            self.record((Edit(node, field, len(new_values), (value,), new_value),))
+                            new_values.extend(new_value)
+                            continue
+                    new_values.append(value)
+                old_value[:] = new_values
+            elif isinstance(old_value, ast.AST):
+                self.visit_field(node, field)
+        return node
+
+
+NO_HOIST = (ast.Lambda, ast.ListComp, ast.SetComp, ast.DictComp, ast.GeneratorExp, ast.JoinedStr)     # expressions inside these cannot be moved out of them
+NOT_HOISTED = (ast.Call, ast.Starred, ast.Slice, ast.NamedExpr, ast.Await)                            # expressions that are never moved into an assignment themselves
+SHARED_NODES = (ast.expr_context, ast.operator, ast.unaryop, ast.cmpop, ast.boolop)                  # ast.parse reuses one instance of these everywhere, so they have no single parent
+
+
+def is_conditional(node, field, index):                     # whether the child of node at field[index] is only evaluated under a condition, so moving it before the statement could raise
+    return isinstance(node, ast.BoolOp) and field == 'values' and index \
+        or isinstance(node, ast.IfExp) and field in ('body', 'orelse') \
+        or isinstance(node, ast.Compare) and field == 'comparators' and index
+
+def is_range_for(node):
+    return isinstance(node, ast.For) and isinstance(node.target, ast.Name) and isinstance(node.iter, ast.Call) and isinstance(node.iter.func, ast.Name) \
+        and node.iter.func.id == "range" and 1 <= len(node.iter.args) <= 3 and not node.iter.keywords
+
+
+class SiteIndex:
+    # Parent links of every node of a tree, and the nodes every mutation can be applied to bucketed by kind. The index
+    # has to be told about every edit made to the tree with update, which only looks at the nodes the edits moved.
+    CONSTANT = "constant"                                   # int and float constants, for expand_constants
+    BINOP = "binop"                                         # binary operations, for swap_numbers
+    RANGE_FOR = "range_for"                                 # for loops over a range, for transform_for
+    EXPRESSION = "expression"                               # expressions of a simple statement that can be assigned to a variable first, for transform_assign
+
+    def __init__(self, root):
+        self.root = root
+        self.parents = {}                                   # node -> (parent, field, whether its expressions can be moved into an assignment)
+        self.buckets = {kind: [] for kind in (self.CONSTANT, self.BINOP, self.RANGE_FOR, self.EXPRESSION)}
+        self.positions = {kind: {} for kind in self.buckets}    # node -> position in the bucket, to remove it in O(1)
+        self.add(root, None, None, False, set())
+
+    def add(self, node, parent, field, hoist, moved):
+        stack = [(node, parent, field, hoist)]
+        while stack:
+            node, parent, field, hoist = stack.pop()
+            if isinstance(node, SHARED_NODES):
+                continue
+            known = self.parents.get(node)
+            self.parents[node] = (parent, field, hoist)
+            expression = hoist and isinstance(node, ast.expr) and not isinstance(node, NOT_HOISTED) and not isinstance(getattr(node, "ctx", None), (ast.Store, ast.Del))
+            if known is not None:                           # already indexed, it was moved along with its subtree
+                moved.add(node)
+                if known[2] == hoist:
+                    continue
+                if expression:                              # moved in or out of a place expressions can be taken from, like the range of a for loop turned into an assignment
+                    self.insert(self.EXPRESSION, node)
+                elif node in self.positions[self.EXPRESSION]:
+                    self.discard(node, self.EXPRESSION)
+            else:
+                if isinstance(node, ast.Constant) and (type(node.value) is int or type(node.value) is float and math.isfinite(node.value)):    # ints too large for a float would overflow isfinite
+                    self.insert(self.CONSTANT, node)
+                elif isinstance(node, ast.BinOp):
+                    self.insert(self.BINOP, node)
+                elif is_range_for(node):
+                    self.insert(self.RANGE_FOR, node)
+                if expression:
+                    self.insert(self.EXPRESSION, node)
+
+            if isinstance(node, ast.stmt):
+                hoist = not hasattr(node, "body")
+            elif isinstance(node, NO_HOIST):
+                hoist = False
+            for child_field, value in reversed(list(ast.iter_fields(node))):     # reversed so that the buckets are filled in source order
+                children = enumerate(value) if isinstance(value, list) else [(None, value)]
+                for index, child in reversed(list(children)):
+                    if isinstance(child, ast.AST):
+                        stack.append((child, node, child_field, hoist and not is_conditional(node, child_field, index)))
+
+    def remove(self, node, moved):
+        stack = [node]
+        while stack:
+            node = stack.pop()
+            if node in moved or node not in self.parents:   # still in the tree somewhere else, or not indexed at all
+                continue
+            del self.parents[node]
+            self.discard(node)
+            stack.extend(ast.iter_child_nodes(node))
+
+    def insert(self, kind, node):
+        if node not in self.positions[kind]:
+            self.positions[kind][node] = len(self.buckets[kind])
+            self.buckets[kind].append(node)
+
+    def discard(self, node, *kinds):                        # takes the node out of its buckets, all of them when no kind is given, by moving the last node of each into its place
+        for kind in kinds or self.buckets:
+            positions = self.positions[kind]
+            position = positions.pop(node, None)
+            if position is not None:
+                bucket = self.buckets[kind]
+                last = bucket.pop()
+                if position < len(bucket):
+                    bucket[position] = last
+                    positions[last] = position
+
+    def update(self, edits):                                # edits were made to the tree, links the nodes they added and drops the ones they took out
+        edits = [edit for edit in edits if edit.parent in self.parents]
+        moved = set()
+        for edit in edits:
+            hoist = self.hoistable(edit.parent) and not is_conditional(edit.parent, edit.field, edit.index)
+            for node in edit.new if edit.index is not None else [edit.new]:
+                if isinstance(node, ast.AST):
+                    self.add(node, edit.parent, edit.field, hoist, moved)
+        for edit in edits:
+            for node in edit.old if edit.index is not None else [edit.old]:
+                if isinstance(node, ast.AST):
+                    self.remove(node, moved)
+
+    def revert(self, mutation):                             # the mutation was undone
+        self.update([Edit(edit.parent, edit.field, edit.index, edit.new, edit.old) for edit in reversed(mutation)])
+
+    def hoistable(self, node):                              # whether the expressions directly under node can be moved into an assignment
+        while node is not None:
+            if isinstance(node, ast.stmt):
+                return not hasattr(node, "body")
+            if isinstance(node, NO_HOIST):
+                return False
+            parent = self.parents.get(node, (None,))[0]
+            location = self.locate(node) if parent is not None else None
+            if location is not None and is_conditional(*location):
+                return False
+            node = parent
+        return False
+
+    def nodes(self, kind):
+        return list(self.buckets[kind])
+
+    def choose(self, kind):                                 # a random node of the kind, None if there are none left
+        bucket = self.buckets[kind]
+        while bucket:
+            node = random.choice(bucket)
+            if self.locate(node) is not None:
+                return node
+            self.discard(node)                              # the tree was changed behind the index's back
+        return None
+
+    def locate(self, node):                                 # (parent, field, index) of the node, index is None when the field is not a list
+        parent, field, _ = self.parents.get(node, (None, None, None))
+        if parent is None:
+            return None
+        value = getattr(parent, field, None)
+        if value is node:
+            return parent, field, None
+        if isinstance(value, list):
+            for index, item in enumerate(value):
+                if item is node:
+                    return parent, field, index
+        return None
+
+    def path(self, node):                                   # where the node is from the root, like body[2].value.left
+        steps = []
+        while node is not self.root:
+            parent, field, index = self.locate(node)
+            steps.append(field if index is None else f"{field}[{index}]")
+            node = parent
+        return ".".join(reversed(steps))
+
+    def edit(self, node, new):                              # the Edit that puts new, a node or a list of nodes, in the place of node
+        parent, field, index = self.locate(node)
+        if index is None:
+            return Edit(parent, field, None, node, new)
+        return Edit(parent, field, index, (node,), tuple(new) if isinstance(new, list) else (new,))
+
+    def ancestors(self, node):
+        parent = self.parents.get(node, (None,))[0]
+        while parent is not None:
+            yield parent
+            parent = self.parents.get(parent, (None,))[0]
+
+    def statement(self, node):                              # the statement node is part of
+        return next(parent for parent in self.ancestors(node) if isinstance(parent, ast.stmt))
+
+
+def exact_int(value, op, other):                            # inner such that (inner op other) == value, None if there is none
+    if op == 0: return value - other
+    if op == 3: return value + other
+    if other == 0: return None
+    if op == 2: return value * other
+    if value % other == 0: return value // other
+    return None
+
+def exact_float(value, op, other):
+    try:
+        if op == 0: inner, back = value - other, lambda x: x + other
+        elif op == 3: inner, back = value + other, lambda x: x - other
+        elif op == 1: inner, back = value / other, lambda x: x * other
+        else: inner, back = value * other, lambda x: x / other
+        if back(inner) == value: return inner
+    except (ZeroDivisionError, OverflowError):
+        pass
+    return None
+
+NUMPY_MIN_BATCH = 256                                       # below this many float candidates setting up a NumPy generator costs more than it saves
+
+def draw_operands(value, n, vectorized=False):              # n random (op, other) pairs, distributed like the operands of the original retry loop
+    if vectorized:
+        rng = np.random.default_rng(random.getrandbits(64))    # seeded from random so that random.seed still makes runs reproducible
+        ops = rng.integers(0, 4, n)
+        others = 500 * rng.integers(1, 11, n) * (rng.random(n) + rng.random(n)) * (1 - 2 * rng.integers(0, 2, n))
+        return ops, others
+    ops = [random.randint(0, 3) for _ in range(n)]
+    if isinstance(value, int):
+        others = [random.randint(-10000, 10000) for _ in range(n)]
+    else:
+        others = [500 * random.randint(1, 10) * (random.random() + random.random()) * (1 - 2 * random.randint(0, 1)) for _ in range(n)]
+    return ops, others
+
+def expand_value(value, k=1):
+    # k triples (inner, op, other) with (inner op other) == value, op indexing op_map_int for ints and op_map_float for floats
+    if isinstance(value, int):
+        triples = []
+        for op, other in zip(*draw_operands(value, k)):
+            if op == 1:
+                other = (math.gcd(value, other) or 1) * (1 if other >= 0 else -1)    # the largest divisor of value that divides the drawn operand
+            elif op == 2 and other == 0:
+                other = 1
+            triples.append((exact_int(value, op, other), op, other))
+        return triples
+
+    if not math.isfinite(value):
+        return []
+    if np is not None and 4 * k >= NUMPY_MIN_BATCH:
+        ops, others = draw_operands(value, 4 * k, True)    # most candidates round-trip, four times as many leaves room for the ones that do not
+        with np.errstate(all='ignore'):
+            inner = np.select([ops == 0, ops == 3, ops == 1], [value - others, value + others, value / others], value * others)
+            back = np.select([ops == 0, ops == 3, ops == 1], [inner + others, inner - others, inner * others], inner / others)
+        triples = [(float(inner[i]), int(ops[i]), float(others[i])) for i in np.flatnonzero(back == value)[:k]]
+    else:
+        triples = []
+        for attempt in range(4):                            # each round draws as many candidates as are still missing
+            if attempt:
+                run_metrics.count("mutations_retried", operator="expand_constants")     # the only operator expanding values
+            for op, other in zip(*draw_operands(value, k - len(triples))):
+                inner = exact_float(value, op, other)
+                if inner is not None:
+                    triples.append((inner, op, other))
+            if len(triples) == k:
+                break
+    if len(triples) < k:
+        run_metrics.count("mutations_retried", operator="expand_constants")
+    while len(triples) < k:
+        for op in (1, 2, 0):                                # halving, doubling or adding 0.0 always round-trips for a finite value
+            inner = exact_float(value, op, 2.0 if op else 0.0)
+            if inner is not None:
+                triples.append((inner, op, 2.0 if op else 0.0))
+                break
+    return triples
+
+
+class ExprMutator(MutationTransformer):
+    EXPAND = 1
+    COMMUTE = 2
+
+    def __init__(self, batch=8, sites=None):
+        self.transform = False
+        self.trials = 0
+        self.mode = self.EXPAND
+        self.mutations = []
+        self.expansions = {}                                # (type, value) -> expansions drawn for that constant and not used yet
+        self.batch = batch                                  # expansions drawn at once for a constant
+        self.sites = sites
+
+    def modify_value(self, src, trials):
+        self.mode = self.EXPAND
+        self.trials = trials
+        sites = self.site_index(src)
+        while self.trials > 0:
+            site = sites.choose(SiteIndex.CONSTANT)
+            if site is None: break                          # no numbers left to expand
+            self.transform = True
+            node = self.visit(site)
+            if node is site: break
+            self.apply(sites.edit(site, node))
+        return (src, self.mutations)
+
+    def commute_value(self, n):
+        self.mode = self.COMMUTE
+        for site in self.site_index(n).nodes(SiteIndex.BINOP):
+            if isinstance(site.op, ast.Add) or isinstance(site.op, ast.Mult):
+                left, right = site.left, site.right
+                self.apply(Edit(site, 'left', None, left, right), Edit(site, 'right', None, right, left))
+        return (n, self.mutations)
+
+    def visit_Constant(self, src):
+        if self.transform and self.mode == self.EXPAND and isinstance(src.value, (int, float)):
+            key = (type(src.value), src.value)
+            if not self.expansions.get(key):
+                self.expansions[key] = expand_value(src.value, max(min(self.trials, self.batch), 1))
+            if not self.expansions[key]:
+                return src
+            inner, op, other = self.expansions[key].pop()
+            op_map = op_map_int if isinstance(src.value, int) else op_map_float
+
+            self.trials -= 1
+            self.transform = False
+            node = ast.fix_missing_locations(ast.BinOp(left = ast.Constant(value=inner), op = op_map[op][1], right = ast.Constant(value=other)))
+            return node
+
+        return src
+
+
+LOOP_SCOPES = (ast.For, ast.AsyncFor, ast.While, ast.FunctionDef, ast.AsyncFunctionDef, ast.Lambda, ast.ClassDef)     # a continue inside these does not belong to the enclosing loop
+
+def has_own_continue(loop):                                 # whether a continue of the loop itself is in its body, it would skip the increment of the while loop it becomes
+    stack = list(loop.body)
+    while stack:
+        node = stack.pop()
+        if isinstance(node, ast.Continue):
+            return True
+        if not isinstance(node, LOOP_SCOPES):
+            stack.extend(ast.iter_child_nodes(node))
+    return False
+
+def analyze_for(node):                                      # None when the step is not a constant int other than 0, the direction of the loop would only be known by running the step
+    args = node.iter.args
+    if len(args) == 1:
+        return [ast.Constant(value=0), ast.Lt(), args[0], ast.Constant(value=1)]
+    elif len(args) == 2:
+        return [args[0], ast.Lt(), args[1], ast.Constant(value=1)]
+    else:
+        try:
+            step = ast.literal_eval(args[2])
+        except ValueError:
+            return None
+        if type(step) is not int or step == 0:
+            return None
+        if step < 0:
+            return [args[0], ast.Gt(), args[1], args[2]]
+        else:
+            return [args[0], ast.Lt(), args[1], args[2]]
+
+
+class ForMutator(MutationTransformer):
+    def __init__(self, sites=None):
+        self.mutations = []
+        self.sites = sites
+
+    def transform_for(self, src):
+        sites = self.site_index(src)
+        loops = [node for node in sites.nodes(SiteIndex.RANGE_FOR) if not any(isinstance(parent, ast.For) for parent in sites.ancestors(node))]    # loops inside another for loop are left as they are
+        for loop in loops:
+            node = self.visit_For(loop)
+            if node is not loop:
+                self.apply(sites.edit(loop, node))
+        return (src, self.mutations)
+
+    def visit_For(self, src):
+        if has_own_continue(src):
+            return src
+        while_args = analyze_for(src)
+        if while_args is None:
+            return src
+        node = [ast.Assign(targets=[src.target], value=while_args[0]), \
+                ast.While(test=ast.Compare(left=ast.Name(id=src.target.id, ctx=ast.Load()), ops=[while_args[1]], comparators=[while_args[2]]), \
+                          body=src.body + [ast.AugAssign(target=copy.deepcopy(src.target), op=ast.Add(), value=while_args[3])], orelse=src.orelse)]
+        for statement in node + node[1].body[-1:]:
+            ast.copy_location(statement, src)               # the new statements take the place of the loop, unparse needs their line numbers
+        return node
+
+
+class AssignMutator(MutationTransformer):
+    def __init__(self, sites=None):
+        self.mutations = []
+        self.sites = sites
+
+    def transform_assign(self, src):
+        sites = self.site_index(src)
+        child = sites.choose(SiteIndex.EXPRESSION)
+        if child is None:                                   # nothing in the tree can be moved into an assignment
+            return (src, self.mutations)
+        parent = sites.statement(child)
+
+        var = ''.join(random.choices(string.ascii_letters + string.digits, k=random.randint(10, 20)))
+        var = var if not var[0].isdigit() else '_' + var
+
+        new_target = ast.Name(id = var, ctx = ast.Store())
+        replace = sites.edit(child, ast.Name(id=new_target.id, ctx=ast.Load()))
+        insert = sites.edit(parent, [ast.copy_location(ast.Assign(targets = [new_target], value=child), parent), parent])    # the child moves into the assignment, it is no longer in the tree anywhere else
+        self.apply(replace, insert)
+
+        return (src, self.mutations)
+
+
+class PythonMutator(MutationTransformer):
+    def __init__(self):
+        self.mutations = MutationJournal()
+        self.sites = None                                   # SiteIndex shared by the mutators, rebuilt when they are given another tree
+
+    def expand_constants(self, src, trials=3):
+        node = ExprMutator(sites=self.site_index(src)).modify_value(src, trials)
+        self.mutations.extend(node[1])
+        return node[0]
+
+    def swap_numbers(self, src):
+        node = ExprMutator(sites=self.site_index(src)).commute_value(src)
+        self.mutations.extend(node[1])
+        return node[0]
+
+    def transform_for(self, src):
+        node = ForMutator(sites=self.site_index(src)).transform_for(src)
+        self.mutations.extend(node[1])
+        return node[0]
+
+    def transform_assign(self, src, trials=3):
+        for i in range(trials):
+            node = AssignMutator(sites=self.site_index(src)).transform_assign(src)
+            self.mutations.extend(node[1])
+        return src
+
+    def reverse_mutation(self, src=None):                   # undoes the last mutation, the tree is edited in place
+        mutation = self.mutations.undo()
+        if self.sites is not None:
+            self.sites.revert(mutation)
+        return mutation
+
+    def redo_mutation(self, src=None):                      # redoes the last mutation undone since the last new one
+        mutation = self.mutations.redo()
+        if self.sites is not None:
+            self.sites.update(mutation)
+        return mutation
+
+    def checkpoint(self):
+        return self.mutations.checkpoint()
+
+    def rollback(self, checkpoint):                         # undoes every mutation made since the checkpoint, returns them in the order they were undone
+        return [self.reverse_mutation() for _ in range(len(self.mutations) - checkpoint)]    # one at a time, the index has to see the tree each mutation was made on
+
+
+# Bulk generation. Every file gets `count` mutants, each made by applying `operations` operators drawn from the
+# weighted mix to the parsed module. The mutants of a file are split in tasks of at most `chunk` mutants, and every task
+# seeds the random module from the run seed, the file and the task number, so a rerun with the same options writes the
+# same mutants whatever the number of jobs. A task parses its file once and rolls the tree back to the original after
+# each mutant instead of copying it.
+OPERATORS = ('expand_constants', 'swap_numbers', 'transform_for', 'transform_assign')
+
+GenerationTask = collections.namedtuple('GenerationTask', ['path', 'name', 'number', 'start', 'count', 'seed'])    # name is the path relative to the corpus, the one seeds and records use
+
+def parse_operator_mix(text):                               # "expand_constants=3,swap_numbers=1" -> {operator: weight}, a bare name has weight 1
+    mix = {}
+    for item in text.split(","):
+        name, _, weight = item.strip().partition("=")
+        if name not in OPERATORS:
+            raise ValueError(f"Unknown operator {name!r}, expected one of {', '.join(OPERATORS)}")
+        mix[name] = float(weight) if weight else 1.0
+    if not any(weight > 0 for weight in mix.values()):
+        raise ValueError("At least one operator needs a positive weight")
+    return mix
+
+def task_seed(seed, name, number):
+    digest = hashlib.sha256(f"{seed}:{name}:{number}".encode()).digest()
+    return int.from_bytes(digest[:8], "little")
+
+def generation_tasks(files, root, count, chunk, seed):
+    for path in files:
+        name = os.path.relpath(path, root)
+        for number, start in enumerate(range(0, count, chunk)):
+            yield GenerationTask(path, name, number, start, min(chunk, count - start), task_seed(seed, name, number))
+
+def unparse_nodes(nodes):
+    return "\n".join(ast.unparse(node) for node in nodes)
+
+def edit_path(sites, edit):
+    path = sites.path(edit.parent)
+    path = f"{path}.{edit.field}" if path else edit.field
+    return path if edit.index is None else f"{path}[{edit.index}]"
+
+def describe_mutation(pm):
+    # Redoes the next undone mutation of pm and returns its edits in JSON friendly form: where each edit was made and the
+    # source of what it replaced, read before the mutation, and of what took its place, read after it
+    mutation = pm.mutations.undone[-1]
+    edits = [{"path": edit_path(pm.sites, edit), "old": ast.unparse(edit.old) if edit.index is None else unparse_nodes(edit.old)} for edit in mutation]
+    pm.redo_mutation()
+    for edit, described in zip(mutation, edits):
+        described["new"] = ast.unparse(edit.new) if edit.index is None else unparse_nodes(edit.new)
+    return edits
+
+_generation_operators = None
+_generation_weights = None
+_generation_operations = None
+
+def init_generation_worker(mix, operations):
+    global _generation_operators, _generation_weights, _generation_operations
+    _generation_operators = list(mix)
+    _generation_weights = list(mix.values())
+    _generation_operations = operations
+
+def generate_mutants(task):                                 # the mutant records of a task
+    try:
+        with run_metrics.stage("parse"):
+            with open(task.path, 'r', encoding="utf8") as f:
+                tree = ast.parse(f.read())
+    except Exception as e:
+        print(f"Syntax error in file {task.path}: {e}")
+        run_metrics.count("parse_failures", error=type(e).__name__)
+        return []
+
+    random.seed(task.seed)
+    pm = PythonMutator()
+    records = []
+    for number in range(task.start, task.start + task.count):
+        original = pm.checkpoint()
+        operations = []
+        for operator in random.choices(_generation_operators, _generation_weights, k=_generation_operations):
+            before = pm.checkpoint()
+            with run_metrics.stage("mutate"):
+                getattr(pm, operator)(tree)
+            edits = []
+            with run_metrics.stage("describe"):
+                for _ in pm.rollback(before):               # replayed one at a time, so that every edit is described in the tree it was made on
+                    edits.extend(describe_mutation(pm))
+            run_metrics.count("mutations_attempted", operator=operator)
+            if edits:
+                operations.append({"operator": operator, "edits": edits})
+                run_metrics.count("mutations_succeeded", operator=operator)
+                run_metrics.count("mutation_edits", len(edits), operator=operator)
+        if operations:
+            with run_metrics.stage("unparse"):
+                source = ast.unparse(tree)
+            records.append({"file": task.name, "mutant": number, "seed": task.seed, "hash": hashlib.sha256(source.encode()).hexdigest(),
+                            "source": source, "mutations": operations})
+        else:
+            run_metrics.count("mutants_empty")              # none of its operators found anything to change
+        pm.rollback(original)
+    run_metrics.count("mutants_generated", len(records))
+    return records
+
+def generate_instrumented(task):                            # the records of a task along with what was counted making them
+    return generate_mutants(task), run_metrics.drain()
+
+def run_generation_pass(tasks, initargs, jobs=1, metrics=None):    # the records of every task in task order, in-process for a single job or over a process pool
+    if jobs <= 1:
+        init_generation_worker(*initargs)
+        yield from collect_metrics(map(generate_instrumented, tasks), metrics)
+        return
+    with multiprocessing.Pool(jobs, initializer=init_generation_worker, initargs=initargs) as pool:
+        yield from collect_metrics(pool.imap(generate_instrumented, tasks), metrics)    # ordered, so that the shards do not depend on which worker finished first
+
+
+class ShardWriter:
+    # Writes records as JSON lines to numbered files of at most `shard_size` records each, only the open shard is kept
+    def __init__(self, directory, prefix="mutants", shard_size=10000, compress=False):
+        self.directory = directory
+        self.prefix = prefix
+        self.shard_size = shard_size
+        self.compress = compress
+        self.file = None
+        self.shards = 0
+        self.in_shard = 0
+        self.records_written = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def open_shard(self):
+        name = os.path.join(self.directory, f"{self.prefix}-{self.shards:05d}.jsonl" + (".gz" if self.compress else ""))
+        self.file = gzip.open(name, 'wt', encoding="utf8") if self.compress else open(name, 'w', encoding="utf8")
+        self.shards += 1
+        self.in_shard = 0
+
+    def write(self, record):
+        if self.file is None or self.in_shard >= self.shard_size:
+            self.close()
+            self.open_shard()
+        self.file.write(json.dumps(record) + "\n")
+        self.in_shard += 1
+        self.records_written += 1
+
+    def write_many(self, records):
+        for record in records:
+            self.write(record)
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def python_files(folder_path):                              # python files under the folder, sorted so that runs see them in the same order
+    files = []
+    for root, dirs, names in os.walk(folder_path):
+        for name in names:
+            if name.endswith(".py"):
+                files.append(os.path.join(root, name))
+    return sorted(files)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate mutants of python files")
+    parser.add_argument("-p", "--path", help="Path to the folder to read files from", required=True)
+    parser.add_argument("-o", "--output", default="mutants", help="Folder the shards of mutants are written to")
+    parser.add_argument("-n", "--count", type=int, default=100, help="Number of mutants generated for each file")
+    parser.add_argument("-m", "--mix", default=",".join(OPERATORS), help="Operators to draw from with their weights, like expand_constants=3,swap_numbers=1")
+    parser.add_argument("-k", "--operations", type=int, default=3, help="Number of operators applied to make each mutant")
+    parser.add_argument("-s", "--seed", type=int, default=0, help="Seed of the run, the same seed and options give the same mutants")
+    parser.add_argument("-j", "--jobs", type=int, default=1, help="Number of worker processes generating mutants (0 uses every core)")
+    parser.add_argument("-c", "--chunk", type=int, default=100, help="Number of mutants of a file generated by one task")
+    parser.add_argument("--shard-size", type=int, default=10000, help="Number of mutants written to each shard")
+    parser.add_argument("-z", "--compress", action="store_true", help="Write gzip compressed shards")
+    add_metrics_arguments(parser)
+    args = parser.parse_args()
+
+    jobs = args.jobs if args.jobs > 0 else os.cpu_count()
+    mix = parse_operator_mix(args.mix)
+
+    files = python_files(args.path) if os.path.isdir(args.path) else [args.path]
+    root = args.path if os.path.isdir(args.path) else os.path.dirname(args.path) or "."
+    tasks = generation_tasks(files, root, args.count, max(args.chunk, 1), args.seed)
+
+    metrics = RunMetrics()
+    with profiling(metrics, args.profile, args.trace_memory):
+        with ShardWriter(args.output, shard_size=args.shard_size, compress=args.compress) as writer:
+            for records in run_generation_pass(tasks, (mix, args.operations), jobs, metrics):
+                with metrics.stage("write"):
+                    writer.write_many(records)
+    metrics.merge(run_metrics.drain())
+    metrics.count("files_scanned", len(files))
+    metrics.count("mutants_written", writer.records_written)
+    print(f"Mutants: {writer.records_written} of {len(files)} files written to {writer.shards} shards in {args.output}")
+    attempted, succeeded, retried = (metrics.by_label(name, "operator") for name in ("mutations_attempted", "mutations_succeeded", "mutations_retried"))
+    for operator in sorted(attempted):
+        print(f"{operator}: {attempted[operator]} attempted, {succeeded.get(operator, 0)} succeeded, {retried.get(operator, 0)} retried")
+    export_metrics(metrics, args, command="mutate", path=args.path, output=args.output, jobs=jobs, seed=args.seed, mix=mix)
@@ -0,0 +1,153 @@
+import os
+import json
+import time
+import cProfile
+import contextlib
+import collections
+
+try:
+    import tracemalloc
+except ImportError:                                         # memory tracing is skipped on interpreters without it
+    tracemalloc = None
+
+# Counters, gauges and per-stage timers of an extraction or mutation run. Worker processes count into their own
+# run_metrics and hand them back drained with each result, so the parent adds up the whole run; stage times are then
+# the sum over every process, not the wall clock. Everything is a dict update or a perf_counter call, cheap enough to
+# leave on. The totals can be written as a JSON report or as a Prometheus textfile.
+
+
+class RunMetrics:
+    def __init__(self):
+        self.counters = collections.Counter()               # (name, labels) -> count, labels being a sorted tuple of (key, value)
+        self.gauges = {}                                    # (name, labels) -> last value set
+        self.stages = {}                                    # stage -> [seconds, runs]
+
+    def count(self, name, n=1, **labels):
+        self.counters[(name, tuple(sorted(labels.items())))] += n
+
+    def gauge(self, name, value, **labels):
+        self.gauges[(name, tuple(sorted(labels.items())))] = value
+
+    def add_time(self, stage, seconds, runs=1):
+        totals = self.stages.setdefault(stage, [0.0, 0])
+        totals[0] += seconds
+        totals[1] += runs
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - start)
+
+    def value(self, name, **labels):
+        return self.counters.get((name, tuple(sorted(labels.items()))), 0)
+
+    def by_label(self, name, label):                        # label value -> count of the counter name
+        values = {}
+        for (counter, labels), count in self.counters.items():
+            if counter == name:
+                key = dict(labels).get(label)
+                values[key] = values.get(key, 0) + count
+        return values
+
+    def drain(self):                                        # a picklable copy of everything counted so far, which is then reset
+        snapshot = (dict(self.counters), dict(self.gauges), {stage: list(totals) for stage, totals in self.stages.items()})
+        self.counters.clear()
+        self.gauges.clear()
+        self.stages.clear()
+        return snapshot
+
+    def merge(self, snapshot):
+        counters, gauges, stages = snapshot
+        self.counters.update(counters)
+        self.gauges.update(gauges)
+        for stage, (seconds, runs) in stages.items():
+            self.add_time(stage, seconds, runs)
+
+    def report(self, meta=None):
+        return {
+            "meta": meta or {},
+            "counters": [{"name": name, "labels": dict(labels), "value": value} for (name, labels), value in sorted(self.counters.items())],
+            "gauges": [{"name": name, "labels": dict(labels), "value": value} for (name, labels), value in sorted(self.gauges.items())],
+            "stages": {stage: {"seconds": seconds, "runs": runs} for stage, (seconds, runs) in sorted(self.stages.items())},
+        }
+
+    def write_json(self, path, meta=None):                  # meta describes the run, e.g. the command line options
+        write_atomically(path, json.dumps(self.report(meta), indent=2) + "\n")
+
+    def write_prometheus(self, path, prefix="pymutator"):
+        # text exposition format, for the textfile collector of the node exporter
+        lines = []
+        def family(name, kind, samples):
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in samples:
+                lines.append(f"{name}{format_labels(labels)} {value}")
+
+        names = sorted({name for name, _ in self.counters})
+        for name in names:
+            family(f"{prefix}_{name}_total", "counter", [(labels, value) for (counter, labels), value in sorted(self.counters.items()) if counter == name])
+        for name in sorted({name for name, _ in self.gauges}):
+            family(f"{prefix}_{name}", "gauge", [(labels, value) for (gauge, labels), value in sorted(self.gauges.items()) if gauge == name])
+        if self.stages:
+            family(f"{prefix}_stage_seconds_total", "counter", [((("stage", stage),), totals[0]) for stage, totals in sorted(self.stages.items())])
+            family(f"{prefix}_stage_runs_total", "counter", [((("stage", stage),), totals[1]) for stage, totals in sorted(self.stages.items())])
+        write_atomically(path, "\n".join(lines) + "\n")
+
+
+def collect_metrics(results, metrics):                      # results of the (result, drained metrics) pairs workers send back, the metrics being added to metrics unless it is None
+    for result, snapshot in results:
+        if metrics is not None:
+            metrics.merge(snapshot)
+        yield result
+
+def format_labels(labels):
+    if not labels:
+        return ""
+    escaped = [(key, str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")) for key, value in labels]
+    return "{" + ",".join(f'{key}="{value}"' for key, value in escaped) + "}"
+
+def write_atomically(path, text):                           # so that a collector never reads half a file
+    temporary = f"{path}.tmp"
+    with open(temporary, 'w', encoding="utf8") as f:
+        f.write(text)
+    os.replace(temporary, path)
+
+
+@contextlib.contextmanager
+def profiling(metrics, profile_path=None, trace_memory=False):
+    # Optional hooks around a whole run: cProfile statistics of this process written to profile_path, and the current
+    # and peak memory allocated by Python recorded as gauges. The wall clock time of the run is always recorded.
+    profiler = cProfile.Profile() if profile_path else None
+    tracing = trace_memory and tracemalloc is not None and not tracemalloc.is_tracing()
+    if tracing:
+        tracemalloc.start()
+    start = time.perf_counter()
+    if profiler is not None:
+        profiler.enable()
+    try:
+        yield
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump_stats(profile_path)
+        metrics.gauge("run_seconds", time.perf_counter() - start)
+        if tracing:
+            current, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            metrics.gauge("memory_current_bytes", current)
+            metrics.gauge("memory_peak_bytes", peak)
+
+
+def add_metrics_arguments(parser):
+    parser.add_argument('--metrics-json', help='Write the counters and stage timings of the run to this JSON file')
+    parser.add_argument('--metrics-prom', help='Write the counters and stage timings of the run to this Prometheus textfile')
+    parser.add_argument('--profile', help='Write cProfile statistics of the main process to this file')
+    parser.add_argument('--trace-memory', action='store_true', help='Record the memory allocated by the main process with tracemalloc')
+
+def export_metrics(metrics, args, **meta):                  # writes the reports asked for on the command line
+    if args.metrics_json:
+        metrics.write_json(args.metrics_json, meta)
+    if args.metrics_prom:
+        metrics.write_prometheus(args.metrics_prom)
@@ -0,0 +1,90 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+from equivalenceChecker import DIFFERENT_OUTPUT, BaselineCache, EquivalenceChecker
+from functionSandbox import CRASH, EXCEPTION, MEMORY, TIMEOUT, SandboxPool
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+ORIGINAL = """
+def f(n):
+    return {str(i) for i in range(n)}, {str(i): i * 2 for i in range(n)}
+"""
+
+@pytest.fixture(scope="module", params=[False, True], ids=["shared", "isolated"])
+def sandbox(request):
+    with SandboxPool(2, timeout=0.5, memory_limit=64 * 1024 * 1024, isolate_jobs=request.param) as pool:
+        yield pool
+
+
+def test_digest_does_not_depend_on_the_hash_seed():
+    script = f"from equivalenceChecker import observe; print(observe({ORIGINAL!r}, [['f', [30], {{}}]], 'm')[0])"
+    digests = {subprocess.run([sys.executable, "-c", script], cwd=ROOT, env=dict(os.environ, PYTHONHASHSEED=str(seed)),
+                              capture_output=True, text=True, check=True).stdout for seed in range(4)}
+    assert len(digests) == 1
+
+def test_mutants_are_compared_to_a_cached_baseline(sandbox, tmp_path):
+    calls = [["f", [5], {}]]
+    cache = BaselineCache(str(tmp_path / "baselines.sqlite"))
+    checker = EquivalenceChecker(sandbox, cache)
+    equivalent = ORIGINAL.replace("i * 2", "2 * i")
+    different = ORIGINAL.replace("i * 2", "i + 2")
+    assert checker.check(ORIGINAL, equivalent, calls) is None
+    assert checker.check(ORIGINAL, different, calls)[0] == DIFFERENT_OUTPUT
+    assert (checker.baseline_runs, checker.baseline_hits) == (1, 1)
+    cache.close()
+
+    checker = EquivalenceChecker(sandbox, BaselineCache(str(tmp_path / "baselines.sqlite")))
+    assert checker.check(ORIGINAL, equivalent, calls) is None
+    assert (checker.baseline_runs, checker.baseline_hits) == (0, 1)
+
+STATEFUL = """
+import random, json
+
+class Token:
+    pass
+
+json.runs = getattr(json, "runs", 0) + 1                    # a module left behind by an earlier job would count it
+print(json.runs, random.random())
+
+def f():
+    raise ValueError(Token())
+"""
+
+def test_equivalent_mutants_of_a_stateful_module_are_not_reported(sandbox):
+    if not sandbox.isolate_jobs:
+        pytest.skip("modules share the state of the worker they run in")
+    checker = EquivalenceChecker(sandbox)
+    verdicts = checker.check_many([(STATEFUL, STATEFUL.replace("+ 1", "+ 2 - 1"), [["f", [], {}]]) for _ in range(3)])
+    assert verdicts == [None] * 3
+    digests = [result.value[0] for result in sandbox.map([checker.job(STATEFUL, [["f", [], {}]])] * 4)]
+    assert len(set(digests)) == 1
+
+
+LIMITS = """
+def spin():
+    while True:
+        pass
+
+def grow():
+    return bytearray(1 << 30)
+
+def fail():
+    raise ValueError("bad")
+
+def die():
+    import os
+    os._exit(3)
+
+def fine(x):
+    return x + 1
+"""
+
+@pytest.mark.parametrize("name, error", [("spin", TIMEOUT), ("grow", MEMORY), ("fail", EXCEPTION), ("die", CRASH)])
+def test_sandbox_limits(sandbox, name, error):
+    result = sandbox.call(f"limits.{name}", LIMITS, name)                # the key names a single function of the source
+    assert not result.ok and result.error == error
+    assert sandbox.call("limits.fine", LIMITS, "fine", (1,)).value == 2     # the pool is still usable afterwards
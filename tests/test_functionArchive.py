@@ -0,0 +1,32 @@
+from functionArchive import FunctionArchive, ArchivedFunctionList, write_function_archive
+
+FUNCTIONS = [
+    {"code": "def f(a: int) -> bool:\n    return a > 0", "name": "f", "params": [["a", "int"]], "return_type": "bool",
+     "has_function_call": False, "fingerprint": "ab" * 32, "copies": 2, "origins": [["a.py", "f"], ["b.py", "f"]]},
+    {"code": "def g(s: str) -> int:\n    return len(s)", "name": "g", "params": [["s", "str"]], "return_type": "int",
+     "has_function_call": True, "fingerprint": "cd" * 32, "copies": 1, "origins": [["c.py", "g"]]},
+]
+
+def read(archive):
+    return [(archive.source(i), archive.name(i), archive.params(i), archive.return_type(i), archive.has_function_call(i),
+             archive.fingerprint(i), archive.copies(i), archive.origins(i)) for i in range(len(archive))]
+
+
+def test_archive_exported_again_keeps_every_field(tmp_path):
+    first, second = str(tmp_path / "first.pmf"), str(tmp_path / "second.pmf")
+    write_function_archive(first, FUNCTIONS)
+    with FunctionArchive(first) as archive:
+        expected = read(archive)
+        write_function_archive(second, ArchivedFunctionList(archive))      # what FunctionDB.load(first).export(second) does
+    with FunctionArchive(second) as archive:
+        assert read(archive) == expected
+    assert expected[0] == (FUNCTIONS[0]["code"], "f", [("a", "int")], "bool", False, "ab" * 32, 2, [["a.py", "f"], ["b.py", "f"]])
+
+
+def test_archived_function_get_reads_the_archive(tmp_path):
+    path = str(tmp_path / "functions.pmf")
+    write_function_archive(path, FUNCTIONS)
+    with FunctionArchive(path) as archive:
+        entry = ArchivedFunctionList(archive)[1]
+        assert entry.get("return_type") == "int" and entry.get("copies") == 1 and entry.get("has_function_call") is True
+        assert entry.get("hash", "missing") == "missing"
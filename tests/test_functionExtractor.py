@@ -0,0 +1,40 @@
+import os
+import sys
+import sqlite3
+import subprocess
+
+EXTRACTOR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "functionExtractor.py")
+SOURCE = """
+def double(x: int) -> int:
+    return x * 2
+"""
+
+def extract(tmp_path, database, *options):
+    subprocess.run([sys.executable, EXTRACTOR, "-p", str(tmp_path / "corpus"), "-s", "sqlite", "-d", str(tmp_path / database),
+                    "-i", str(tmp_path / "index.sqlite"), *options], check=True, capture_output=True)
+    return sqlite3.connect(tmp_path / database).execute("SELECT name, copies FROM functions ORDER BY id").fetchall()
+
+
+def test_index_fills_a_new_store_and_follows_keep_duplicates(tmp_path):
+    (tmp_path / "corpus").mkdir()
+    for name in ("first.py", "second.py"):
+        (tmp_path / "corpus" / name).write_text(SOURCE)
+    assert extract(tmp_path, "first.sqlite") == [("double", 2)]
+    assert extract(tmp_path, "second.sqlite") == [("double", 2)]         # nothing changed in the corpus, but the store is a new one
+    assert extract(tmp_path, "second.sqlite", "-k") == [("double", 1), ("double", 1)]
+    assert extract(tmp_path, "second.sqlite") == [("double", 2)]
+
+
+def test_every_mode_stores_the_same_rows_in_the_same_order(tmp_path):
+    # "a-b" sorts before "a/" as a path but is listed after it, and files are listed before the folders next to them
+    for number, name in enumerate(["z.py", "a/x.py", "a-b/y.py", "a/b/w.py", "c.py"]):
+        path = tmp_path / "corpus" / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(SOURCE + f"\ndef f{number}(x: int) -> int:\n    return x + {number}\n")
+    tables = []
+    for mode, options in [("sequential", []), ("jobs", ["-j", "2"]), ("pipeline", ["--pipeline", "-c", "1"]), ("index", ["-i", str(tmp_path / "index.sqlite")])]:
+        subprocess.run([sys.executable, EXTRACTOR, "-p", str(tmp_path / "corpus"), "-s", "sqlite", "-d", str(tmp_path / f"{mode}.sqlite"), *options],
+                       check=True, capture_output=True)
+        tables.append(sqlite3.connect(tmp_path / f"{mode}.sqlite").execute("SELECT name, file_name, copies, origins FROM functions ORDER BY id").fetchall())
+    assert all(table == tables[0] for table in tables)
+    assert [name for name, *_ in tables[0]] == ["double", "f4", "f0", "f1", "f3", "f2"]     # c.py, z.py, a/x.py, a/b/w.py, a-b/y.py
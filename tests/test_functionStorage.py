@@ -0,0 +1,21 @@
+import sqlite3
+
+from functionStorage import SQLiteFunctionStore
+
+
+def test_table_of_an_earlier_version_gets_the_new_columns(tmp_path):
+    path = str(tmp_path / "functions.sqlite")
+    connection = sqlite3.connect(path)
+    connection.execute("""CREATE TABLE functions (id INTEGER PRIMARY KEY AUTOINCREMENT, name VARCHAR(255) NOT NULL, file_name VARCHAR(255) NOT NULL,
+                          return_type VARCHAR(255) NOT NULL, has_function_call BOOLEAN NOT NULL, src TEXT NOT NULL)""")
+    connection.execute("INSERT INTO functions (name, file_name, return_type, has_function_call, src) VALUES ('old', 'old.py', 'int', 0, 'def old(): pass')")
+    connection.commit()
+    connection.close()
+
+    with SQLiteFunctionStore(path, batch_size=1) as store:
+        store.insert(("def f(): pass", "f", "f.py", "int", False, "ab" * 32, 1, '[["f.py", "f"]]'))
+
+    connection = sqlite3.connect(path)
+    rows = connection.execute("SELECT name, fingerprint, copies, origins FROM functions ORDER BY id").fetchall()
+    assert rows == [("old", "", 1, "[]"), ("f", "ab" * 32, 1, '[["f.py", "f"]]')]
+    assert "functions_fingerprint" in [row[1] for row in connection.execute("PRAGMA index_list(functions)")]
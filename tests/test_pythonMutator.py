@@ -0,0 +1,163 @@
+import ast
+import random
+
+import pytest
+
+from pythonMutator import OPERATORS, MutationJournal, PythonMutator, SiteIndex
+
+SOURCE = """
+def f(a, b):
+    total = 0
+    for i in range(10):
+        total += len(a) * i + 3
+    c = (b + 2) * 4.5
+    return [x + 1 for x in a] if a else total - c
+"""
+
+def mutate(source, operators, seed):
+    random.seed(seed)
+    tree = ast.parse(source)
+    pm = PythonMutator()
+    for operator in operators:
+        getattr(pm, operator)(tree)
+    return tree, pm
+
+def run(tree, name, *args):
+    namespace = {}
+    exec(compile(ast.fix_missing_locations(tree), "<mutant>", "exec"), namespace)
+    return namespace[name](*args)
+
+
+def test_journal_undo_redo():
+    journal = MutationJournal()
+    journal.extend([[], []])                                # mutations without edits, only the bookkeeping is checked
+    assert len(journal) == 2 and journal.checkpoint() == 2
+    journal.undo()
+    assert len(journal) == 1
+    journal.redo()
+    assert len(journal) == 2
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_rollback_restores_the_tree(seed):
+    operators = random.Random(seed).choices(OPERATORS, k=6)
+    tree, pm = mutate(SOURCE, operators, seed)
+    mutated = ast.dump(tree)
+    pm.rollback(0)
+    assert ast.dump(tree) == ast.dump(ast.parse(SOURCE))
+    while pm.mutations.undone:
+        pm.redo_mutation()
+    assert ast.dump(tree) == mutated
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_index_matches_a_rebuilt_index(seed):
+    # the buckets the index keeps up to date edit by edit are the ones a fresh index of the mutated tree has
+    random.seed(seed)
+    tree = ast.parse(SOURCE)
+    pm = PythonMutator()
+    for _ in range(8):
+        getattr(pm, random.choice(OPERATORS))(tree)
+        fresh = SiteIndex(tree)
+        for kind, bucket in fresh.buckets.items():
+            assert {id(node) for node in pm.sites.buckets[kind] if pm.sites.locate(node)} == {id(node) for node in bucket}
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_mutants_compute_the_same_values(seed):
+    tree, _ = mutate(SOURCE, OPERATORS * 2, seed)
+    assert run(tree, "f", [1, 2], 3) == run(ast.parse(SOURCE), "f", [1, 2], 3)
+    assert run(tree, "f", [], 3) == run(ast.parse(SOURCE), "f", [], 3)
+
+
+def test_int_larger_than_a_float_is_expanded():
+    source = "x = " + "9" * 400 + "\n"
+    assert int("9" * 400) > 1e308
+    tree, _ = mutate(source, ["expand_constants"], 0)
+    assert run(ast.parse(ast.unparse(tree) + "\ndef get():\n    return x"), "get") == int("9" * 400)
+
+
+CONDITIONAL = """
+def f(a, b, c):
+    x = a and a[0]
+    y = a[0] if a else b
+    z = 0 < len(a) < a[0] + 1
+    w = (n := len(a)) + 1
+    return x, y, z, w, b or c[1]
+"""
+
+@pytest.mark.parametrize("seed", range(50))
+def test_conditional_operands_are_not_hoisted(seed):
+    # a[0] and c[1] are only evaluated when a is not empty and b is false, moving them into an assignment before the statement would raise
+    tree, _ = mutate(CONDITIONAL, ["transform_assign"] * 6, seed)
+    assert run(tree, "f", [], 5, [1, 2]) == ([], 5, False, 1, 5)
+
+
+LOOPS = """
+def f(n):
+    total = 0
+    for i in range(n):
+        if i % 2:
+            continue
+        total += i
+    for j in range(2, n, 3):
+        for k in range(j):
+            if k == 1:
+                continue
+            total += k
+        while total > 100:
+            total -= 7
+    return total
+"""
+
+def test_loops_with_their_own_continue_are_left_as_for_loops():
+    tree, _ = mutate(LOOPS, ["transform_for"], 0)
+    loops = [node for node in tree.body[0].body if isinstance(node, (ast.For, ast.While))]
+    assert [type(node) for node in loops] == [ast.For, ast.While]     # the first loop continues itself, the continue of the second belongs to the inner loop
+    assert run(tree, "f", 10) == run(ast.parse(LOOPS), "f", 10)
+
+def test_while_loop_does_not_share_the_target_node():
+    tree, _ = mutate("for i in range(3):\n    x = i\n", ["transform_for"], 0)
+    assign, loop = tree.body
+    assert assign.targets[0] is not loop.body[-1].target
+
+STEPS = """
+def f(n, calls):
+    def step():
+        calls.append(n)
+        return 2
+    total = 0
+    for i in range(n, 0, -3):
+        total += i
+    for j in range(0, n, step()):
+        total += j
+    for k in range(0, n, print("step") or 1):
+        total += k
+    return total
+"""
+
+def test_loops_are_only_rewritten_for_a_constant_step(capsys):
+    tree, _ = mutate(STEPS, ["transform_for"], 0)
+    assert capsys.readouterr().out == ""                    # nothing of the program runs while it is mutated
+    loops = [node for node in tree.body[0].body if isinstance(node, (ast.For, ast.While))]
+    assert [type(node) for node in loops] == [ast.While, ast.For, ast.For]
+    calls = []
+    assert run(tree, "f", 10, calls) == run(ast.parse(STEPS), "f", 10, []) and calls == [10]   # the step was only called when the loop ran
+
+
+def generate(folder, output, jobs):
+    from pythonMutator import generation_tasks, python_files, run_generation_pass, ShardWriter
+    files = python_files(folder)
+    with ShardWriter(output, shard_size=7) as writer:
+        for records in run_generation_pass(generation_tasks(files, folder, 12, 5, 3), ({operator: 1.0 for operator in OPERATORS}, 3), jobs):
+            writer.write_many(records)
+    return {path.name: path.read_bytes() for path in sorted(output.iterdir())}
+
+def test_shards_do_not_depend_on_the_number_of_jobs(tmp_path):
+    corpus = tmp_path / "corpus"
+    (corpus / "sub").mkdir(parents=True)
+    (corpus / "a.py").write_text(SOURCE)
+    (corpus / "sub" / "b.py").write_text(LOOPS)
+    (corpus / "bad.py").write_text("def (:\n")
+    single = generate(str(corpus), tmp_path / "one", 1)
+    assert len(single) > 1 and single == generate(str(corpus), tmp_path / "two", 2)
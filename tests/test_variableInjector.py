@@ -0,0 +1,38 @@
+import os
+import ast
+import random
+import contextlib
+import io
+
+import pytest
+
+from functionCatalog import COMPATIBLE_RETURN_TYPES
+from mutatorBenchmarks import load_notebook
+
+NOTEBOOK = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "Mutator.ipynb")
+
+
+@pytest.fixture(scope="module")
+def injector():
+    return load_notebook(NOTEBOOK, required=("VariableInjector",))["VariableInjector"]()
+
+def printed(expression, value):
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        exec(compile(ast.fix_missing_locations(ast.Module(body=[ast.Expr(ast.Call(ast.Name("print", ast.Load()), [expression], []))], type_ignores=[])), "<injected>", "exec"), {"v": value})
+    return output.getvalue()
+
+
+@pytest.mark.parametrize("constant", [1, 0, 7, -3, 1.0, 0.0, 2.5, True, False])
+@pytest.mark.parametrize("value", [1, 0, 3, 1.0, 0.5, True, False])
+def test_injected_constants_print_the_same(injector, constant, value):
+    random.seed(0)
+    for _ in range(8):
+        node = injector.unify_value(ast.Constant(constant), ast.Name("v", ast.Load()), value)
+        if node is None:
+            return
+        assert printed(node, value) == printed(ast.Constant(constant), None), ast.unparse(node)
+
+def test_bools_only_come_from_bools():
+    assert COMPATIBLE_RETURN_TYPES[bool] == ('bool',)
+    assert all('bool' not in types for kind, types in COMPATIBLE_RETURN_TYPES.items() if kind is not bool)